@@ -1,12 +1,33 @@
-from flask import Flask, render_template, request, redirect, url_for, session, jsonify, flash, send_from_directory
+from flask import Flask, g, render_template, request, redirect, url_for, session, jsonify, flash, send_from_directory, Response, stream_with_context, make_response
 from functools import wraps
 import sqlite3
 import os
+import hashlib
 import json
-import random
-from datetime import datetime, date
+from datetime import datetime, timezone
 from werkzeug.utils import secure_filename
-from database import init_db, get_db_connection
+from werkzeug.http import is_resource_modified
+from database import init_app, get_db
+import tasks
+import export
+import images
+import assets
+import search
+import filters
+import read_model
+import sitemap
+import async_db
+import view_counter
+import uploads
+import sweeper
+import importer
+from filters import parse_price
+import templating
+import startup
+import metrics
+import slowlog
+import hmac
+from cache import response_cache, bump_content_version, get_content_version
 
 app = Flask(__name__,
             static_folder="static", static_url_path='')
@@ -18,114 +39,177 @@ ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif', 'webp'}
 app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
 app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max file size
 
-# Initialize database on startup
-init_db()
+# SQLite connection tuning (per pooled connection)
+app.config['SQLITE_CACHE_SIZE_KB'] = int(os.environ.get('SQLITE_CACHE_SIZE_KB', 16384))
+app.config['SQLITE_MMAP_SIZE'] = int(os.environ.get('SQLITE_MMAP_SIZE', 64 * 1024 * 1024))
+init_app(app)
 
-# Ensure upload directory exists
-os.makedirs(UPLOAD_FOLDER, exist_ok=True)
+# Request/SQL/template timings: Server-Timing header and /admin/metrics
+app.config['METRICS_ENABLED'] = os.environ.get('METRICS_ENABLED', '1') == '1'
+app.config['METRICS_TOKEN'] = os.environ.get('METRICS_TOKEN') or None
+metrics.init_app(app)
 
-# Metadata file path for tracking view updates
-METADATA_FILE = 'static/view_update_metadata.json'
+# Statements slower than SLOW_QUERY_MS (negative disables) are logged with their plan
+app.config['SLOW_QUERY_MS'] = float(os.environ.get('SLOW_QUERY_MS', 50))
+app.config['SLOW_QUERY_LOG'] = os.environ.get('SLOW_QUERY_LOG', 'slow_queries.log')
+slowlog.init_app(app)
+
+# Full-page cache for public routes; set RESPONSE_CACHE_DIR to share it between workers
+app.config['RESPONSE_CACHE_ENABLED'] = os.environ.get('RESPONSE_CACHE_ENABLED', '1') == '1'
+app.config['RESPONSE_CACHE_DIR'] = os.environ.get('RESPONSE_CACHE_DIR') or None
+response_cache.init_app(app)
+
+# Daily background jobs (view bump) and their CLI commands
+app.config['SCHEDULER_ENABLED'] = os.environ.get('SCHEDULER_ENABLED', '1') == '1'
+tasks.init_app(app)
+export.init_app(app)
+images.init_app(app)
+uploads.init_app(app)
+
+# Released uploads are deleted by a background sweeper, which also reconciles
+# the upload folder against listing references
+app.config['UPLOAD_SWEEP_ENABLED'] = os.environ.get('UPLOAD_SWEEP_ENABLED', '1') == '1'
+app.config['UPLOAD_SWEEP_INTERVAL'] = int(os.environ.get('UPLOAD_SWEEP_INTERVAL', 60))
+app.config['UPLOAD_RECONCILE_INTERVAL'] = int(os.environ.get('UPLOAD_RECONCILE_INTERVAL', 24 * 3600))
+app.config['UPLOAD_ORPHAN_GRACE'] = int(os.environ.get('UPLOAD_ORPHAN_GRACE', 3600))
+sweeper.init_app(app)
+
+importer.init_app(app)
+assets.init_app(app)
+filters.init_app(app)
+
+# Real detail-page views, buffered per worker and written in batches
+app.config['VIEW_COUNTER_ENABLED'] = os.environ.get('VIEW_COUNTER_ENABLED', '1') == '1'
+app.config['VIEW_FLUSH_INTERVAL'] = int(os.environ.get('VIEW_FLUSH_INTERVAL', 30))
+view_counter.init_app(app)
+
+# Per-worker in-memory snapshot of active listings for the public list pages
+app.config['READ_MODEL_ENABLED'] = os.environ.get('READ_MODEL_ENABLED', '1') == '1'
+app.config['READ_MODEL_VIEW_REFRESH'] = int(os.environ.get('READ_MODEL_VIEW_REFRESH', 60))
+read_model.init_app(app)
+
+# Sitemaps and the listings feed, generated once per content version
+app.config['SITEMAP_CACHE_DIR'] = os.environ.get('SITEMAP_CACHE_DIR', '.sitemap_cache')
+sitemap.init_app(app)
+
+# Database threads of the ASGI entry point (asgi.py)
+app.config['ASYNC_DB_THREADS'] = int(os.environ.get('ASYNC_DB_THREADS', 8))
+async_db.init_app(app)
+
+# Compiled templates: bytecode cache on disk, optional warm-up at startup
+app.config['TEMPLATE_CACHE_DIR'] = os.environ.get('TEMPLATE_CACHE_DIR', '.jinja_cache')
+app.config['TEMPLATE_WARMUP'] = os.environ.get('TEMPLATE_WARMUP', '0') == '1'
+templating.init_app(app)
+
+# Migrations and the upload folder; the production launcher sets
+# PREPARE_ON_IMPORT=0 and prepares once in the master before forking workers
+app.config['PREPARE_ON_IMPORT'] = os.environ.get('PREPARE_ON_IMPORT', '1') == '1'
+startup.init_app(app)
 
 def allowed_file(filename):
     return '.' in filename and \
            filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
 def save_uploaded_file(file):
-    """Save uploaded file with unique name and return the path"""
+    """Save uploaded file under its content hash and return the path"""
     if file and allowed_file(file.filename):
-        # Create unique filename with timestamp
-        timestamp = datetime.now().strftime('%Y%m%d%H%M%S')
         extension = file.filename.rsplit('.', 1)[1].lower()
-        filename = f"{timestamp}.{extension}"
-        filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-        file.save(filepath)
+        # Identical images share one file; this takes a reference to it
+        filepath, created = uploads.store_upload(get_db(), file, extension)
+        if created:
+            # Queued for deletion if this request's transaction rolls back
+            sweeper.track_new_upload(filepath)
+            # Resized thumbnail/card/full variants are built in the background
+            images.schedule_derivatives(filepath)
         return filepath
     return None
 
-def parse_price(price_str):
-    """Parse formatted price string (e.g., '5.950.000') to float"""
-    if not price_str:
-        return None
-    # Remove dots and convert to float
-    clean_price = price_str.replace('.', '')
-    try:
-        return float(clean_price)
-    except ValueError:
-        return None
-
 def format_price_display(price):
     """Format price for display with Turkish formatting"""
     if not price:
         return None
     return '{:,.0f}'.format(price).replace(',', '.')
 
-def get_last_update_date():
-    """Get the last view update date from metadata file"""
-    try:
-        if os.path.exists(METADATA_FILE):
-            with open(METADATA_FILE, 'r') as f:
-                data = json.load(f)
-                return datetime.strptime(data['last_update'], '%Y-%m-%d').date()
-    except (FileNotFoundError, KeyError, ValueError):
-        pass
-    return None
+# Cached listing counts, keyed by (content version, where clause, params)
+_listing_count_cache = {}
+
+def get_listing_count(conn, where, params, source='ilanlar'):
+    """Return COUNT(*) for a listing filter, cached until the next admin write"""
+    key = (get_content_version(), source, where, tuple(params))
+    total = _listing_count_cache.get(key)
+    if total is None:
+        total = conn.execute(f'SELECT COUNT(*) as total FROM {source} WHERE {where}', params).fetchone()['total']
+        if len(_listing_count_cache) > 1024:
+            # Search terms are user input, keep the cache bounded
+            _listing_count_cache.clear()
+        _listing_count_cache[key] = total
+    return total
+
+def invalidate_listing_caches(conn):
+    """Invalidate cached pages and counts in every worker (caller commits)"""
+    bump_content_version(conn)
+    _listing_count_cache.clear()
+
+def _template_fingerprint():
+    """Hash of all templates and the asset manifest, so a deploy changes every ETag"""
+    digest = hashlib.sha1()
+    for root, dirs, files in sorted(os.walk(os.path.join(app.root_path, 'templates'))):
+        for name in sorted(files):
+            with open(os.path.join(root, name), 'rb') as f:
+                digest.update(f.read())
+    digest.update(repr(sorted(assets.load_manifest().items())).encode('utf-8'))
+    return digest.digest()
+
+PAGE_ETAG_SALT = _template_fingerprint()
 
-def save_update_date():
-    """Save current date as last update date in metadata file"""
+def parse_db_timestamp(value):
+    """Parse an SQLite CURRENT_TIMESTAMP value (UTC) into an aware datetime"""
     try:
-        data = {'last_update': date.today().strftime('%Y-%m-%d')}
-        with open(METADATA_FILE, 'w') as f:
-            json.dump(data, f)
-    except Exception as e:
-        print(f"Error saving update date: {e}")
+        return datetime.strptime(str(value)[:19].replace('T', ' '), '%Y-%m-%d %H:%M:%S').replace(tzinfo=timezone.utc)
+    except ValueError:
+        return None
 
-def update_views():
-    """Update all advertisement views with random increments based on days since last update"""
-    last_update = get_last_update_date()
-    current_date = date.today()
-    
-    if last_update is None:
-        # First time running, just save current date
-        save_update_date()
-        return
-    
-    # Calculate days since last update
-    days_diff = (current_date - last_update).days
-    
-    if days_diff == 0:
-        # Already updated today, skip
-        return
-    
-    # Update views for all active advertisements
-    conn = get_db_connection()
-    
+def page_validators(rows, dated=True):
+    """Strong ETag and Last-Modified for a page showing the given rows.
+
+    List pages pass dated=False: they change when rows leave or move
+    between pages, which no shown update_date records, so If-Modified-Since
+    alone could get a stale 304. They are validated by ETag only.
+    """
+    digest = hashlib.sha1(PAGE_ETAG_SALT)
+    digest.update(repr((request.full_path, get_language())).encode('utf-8'))
+    last_modified = None
+    for row in rows:
+        digest.update(f"{row['id']}:{row['update_date']}:{row['view']};".encode('utf-8'))
+        modified = parse_db_timestamp(row['update_date'])
+        if modified and (last_modified is None or modified > last_modified):
+            last_modified = modified
+    return digest.hexdigest(), last_modified if dated else None
+
+def not_modified_response(etag, last_modified):
+    """Return a 304 if the client's validators still match, otherwise None"""
+    if is_resource_modified(request.environ, etag=etag, last_modified=last_modified):
+        return None
+    response = Response(status=304)
+    return set_validators(response, etag, last_modified)
+
+def set_validators(response, etag, last_modified):
+    """Attach ETag / Last-Modified headers to a rendered page"""
+    response = make_response(response)
+    response.set_etag(etag)
+    if last_modified:
+        response.last_modified = last_modified
+    return response
+
+def parse_listing_cursor(value):
+    """Parse an 'after' cursor of the form '<creation_date>,<id>'"""
+    if not value or ',' not in value:
+        return None
+    creation_date, _, ad_id = value.rpartition(',')
     try:
-        # Get all active advertisements
-        advertisements = conn.execute('''
-            SELECT id FROM ilanlar WHERE status = 1
-        ''').fetchall()
-        
-        for ad in advertisements:
-            # Generate random increment between 4 and 15, multiplied by days
-            random_increment = random.randint(4, 15) * days_diff
-            
-            # Update the view count
-            conn.execute('''
-                UPDATE ilanlar SET view = view + ? WHERE id = ?
-            ''', (random_increment, ad['id']))
-        
-        conn.commit()
-        print(f"Updated views for {len(advertisements)} advertisements with {days_diff} days of increments")
-        
-    except Exception as e:
-        print(f"Error updating views: {e}")
-        conn.rollback()
-    finally:
-        conn.close()
-    
-    # Save current date as last update
-    save_update_date()
+        return creation_date, int(ad_id)
+    except ValueError:
+        return None
 
 # Add template filter for price formatting
 app.jinja_env.filters['format_price'] = format_price_display
@@ -139,6 +223,13 @@ def set_language(lang):
     """Set language in session"""
     session['language'] = lang
 
+@app.before_request
+def apply_language_param():
+    """Let ?lang= pick the language, so every language version has its own URL"""
+    lang = request.args.get('lang')
+    if lang in sitemap.LANGUAGES and lang != get_language():
+        set_language(lang)
+
 # Language texts mapping
 LANGUAGE_TEXTS = {
     'tr': {
@@ -188,6 +279,14 @@ LANGUAGE_TEXTS = {
         'for_rent_ads': 'Kiralık İlanlar',
         'contract_number': 'Sözleşme No',
         'contract_number_placeholder': 'Sözleşme numarasını girin...',
+        'search_listings': 'İlan Ara',
+        'search_listings_placeholder': 'Başlık, adres veya sözleşme no...',
+        'try_different_search': 'Farklı bir arama ile tekrar deneyin.',
+        'filter_type': 'Emlak Tipi',
+        'filter_bed_type': 'Oda Sayısı',
+        'filter_price_range': 'Fiyat Aralığı',
+        'filter_all': 'Tümü',
+        'clear_filters': 'Filtreleri Temizle',
         'search_button': 'Ara',
         'price_not_specified': 'Fiyat Belirtilmemiş',
         'click_for_details': 'Detaylar için tıklayın...',
@@ -258,6 +357,14 @@ LANGUAGE_TEXTS = {
         'for_rent_ads': 'For Rent Advertisements',
         'contract_number': 'Contract Number',
         'contract_number_placeholder': 'Enter contract number...',
+        'search_listings': 'Search Listings',
+        'search_listings_placeholder': 'Title, address or contract number...',
+        'try_different_search': 'Try a different search.',
+        'filter_type': 'Property Type',
+        'filter_bed_type': 'Rooms',
+        'filter_price_range': 'Price Range',
+        'filter_all': 'All',
+        'clear_filters': 'Clear Filters',
         'search_button': 'Search',
         'price_not_specified': 'Price Not Specified',
         'click_for_details': 'Click for details...',
@@ -328,6 +435,14 @@ LANGUAGE_TEXTS = {
         'for_rent_ads': 'إعلانات للإيجار',
         'contract_number': 'رقم العقد',
         'contract_number_placeholder': 'أدخل رقم العقد...',
+        'search_listings': 'ابحث في الإعلانات',
+        'search_listings_placeholder': 'العنوان أو الموقع أو رقم العقد...',
+        'try_different_search': 'جرب بحثاً مختلفاً.',
+        'filter_type': 'نوع العقار',
+        'filter_bed_type': 'عدد الغرف',
+        'filter_price_range': 'نطاق السعر',
+        'filter_all': 'الكل',
+        'clear_filters': 'مسح الفلاتر',
         'search_button': 'بحث',
         'price_not_specified': 'السعر غير محدد',
         'click_for_details': 'انقر للتفاصيل...',
@@ -353,17 +468,35 @@ LANGUAGE_TEXTS = {
     }
 }
 
+class TextTable(dict):
+    """A language's texts; unknown keys render as the key itself"""
+    def __missing__(self, key):
+        return key
+
+# One lookup table per language, built once at import
+TEXT_TABLES = {lang: TextTable(texts) for lang, texts in LANGUAGE_TEXTS.items()}
+
+def get_texts():
+    """Text table of the current language, resolved once per request"""
+    if 'texts' not in g:
+        g.texts = TEXT_TABLES.get(get_language(), TEXT_TABLES['tr'])
+    return g.texts
+
 def get_text(key):
     """Get text for current language"""
-    lang = get_language()
-    return LANGUAGE_TEXTS.get(lang, LANGUAGE_TEXTS['tr']).get(key, key)
+    return get_texts()[key]
+
+# Public pages are cached per language
+cached_page = response_cache.cached(vary=get_language)
 
 # Add template context processor
 @app.context_processor
 def inject_language():
+    # Templates call get_text() dozens of times per page; hand them the
+    # table's own lookup so each call is a plain dict access
     return {
         'current_language': get_language(),
-        'get_text': get_text
+        'get_text': get_texts().__getitem__
     }
 
 # Static admin credentials
@@ -379,17 +512,32 @@ def login_required(f):
     return decorated_function
 
 @app.route('/')
+@cached_page
 def index():
-    # Check if views have been updated in this session
-    if not session.get('is_view_updated', False):
-        update_views()
-        session['is_view_updated'] = True
+    snapshot = read_model.get_snapshot()
+    if snapshot is not None:
+        # Both lists are the ends of presorted in-memory orderings
+        popular_ads = snapshot.most_viewed(5)
+        recommended_ads = snapshot.newest(5)
+    else:
+        popular_ads, recommended_ads = get_home_listings(get_db())
     
-    conn = get_db_connection()
+    # Answer revalidations before rendering the template
+    etag, last_modified = page_validators(popular_ads + recommended_ads, dated=False)
+    not_modified = not_modified_response(etag, last_modified)
+    if not_modified:
+        return not_modified
     
+    # One query for the srcsets of every card image
+    images.load_srcsets(ad['img_1'] for ad in popular_ads + recommended_ads)
+    html = render_template('index.html', popular_ads=popular_ads, recommended_ads=recommended_ads)
+    return set_validators(html, etag, last_modified)
+
+def get_home_listings(conn):
+    """Popular and recommended listings for the homepage, from SQLite"""
     # Get popular advertisements (highest views, max 5)
     popular_ads = conn.execute('''
-        SELECT id, title, advertisement_type, img_1, sale_price, rent_price, view, is_gold
+        SELECT id, title, advertisement_type, img_1, sale_price, rent_price, view, is_gold, update_date
         FROM ilanlar 
         WHERE status = 1 
         ORDER BY view DESC 
@@ -398,117 +546,177 @@ def index():
     
     # Get recommended advertisements (newest, max 5)
     recommended_ads = conn.execute('''
-        SELECT id, title, advertisement_type, img_1, sale_price, rent_price, view, is_gold
+        SELECT id, title, advertisement_type, img_1, sale_price, rent_price, view, is_gold, update_date
         FROM ilanlar 
         WHERE status = 1 
         ORDER BY creation_date DESC 
         LIMIT 5
     ''').fetchall()
-    
-    conn.close()
-    
-    return render_template('index.html', popular_ads=popular_ads, recommended_ads=recommended_ads)
+    return popular_ads, recommended_ads
 
 @app.route('/hakkimizda')
+@cached_page
 def hakkimizda():
-    # Check if views have been updated in this session
-    if not session.get('is_view_updated', False):
-        update_views()
-        session['is_view_updated'] = True
-    
     return render_template('about.html')
 
 @app.route('/iletisim')
+@cached_page
 def iletisim():
-    # Check if views have been updated in this session
-    if not session.get('is_view_updated', False):
-        update_views()
-        session['is_view_updated'] = True
-    
     return render_template('iletisim.html')
 
+def xml_response(name, make_chunks, mimetype='application/xml'):
+    """Stream a generated XML document, cached until the listings change"""
+    version = get_content_version()
+    # Documents hold absolute URLs, so each host name gets its own copy
+    name = f"{name}-{hashlib.sha1(request.host_url.encode('utf-8')).hexdigest()[:8]}"
+    response = Response(stream_with_context(sitemap.cached_stream(name, version, make_chunks)),
+                        mimetype=mimetype)
+    response.set_etag(f'{name}-{version}')
+    return response.make_conditional(request)
+
+@app.route('/sitemap.xml')
+def sitemap_index():
+    """Sitemap index: static pages plus one sitemap per 50k listing ids"""
+    def chunks():
+        listing_sitemaps = [(url_for('listings_sitemap', chunk=chunk, _external=True), lastmod)
+                            for chunk, lastmod in sitemap.listing_chunks()]
+        return sitemap.iter_sitemap_index(url_for('pages_sitemap', _external=True), listing_sitemaps)
+    return xml_response('index', chunks)
+
+@app.route('/sitemap-pages.xml')
+def pages_sitemap():
+    urls = [url_for(endpoint, _external=True) for endpoint in ('index', 'ilanlar', 'hakkimizda', 'iletisim')]
+    return xml_response('pages', lambda: sitemap.iter_pages_sitemap(urls))
+
+@app.route('/sitemap-listings-<int:chunk>.xml')
+def listings_sitemap(chunk):
+    # The detail URL without its id, so rows are formatted without url_for
+    prefix = url_for('ilan_detay', id=0, _external=True)[:-1]
+    return xml_response(f'listings-{chunk}', lambda: sitemap.iter_listings_sitemap(prefix, chunk))
+
+@app.route('/feed.xml')
+def listings_feed():
+    """RSS feed of the newest listings in the requested (or current) language"""
+    lang = get_language()
+    title = f"Today Proje Gayrimenkul - {LANGUAGE_TEXTS[lang]['advertisements']}"
+    prefix = url_for('ilan_detay', id=0, _external=True)[:-1]
+    return xml_response(f'feed-{lang}', lambda: sitemap.iter_feed(
+        lang, title, url_for('index', _external=True), url_for('listings_feed', lang=lang, _external=True), prefix),
+        mimetype='application/rss+xml')
+
+@app.route('/robots.txt')
+def robots_txt():
+    return Response(f"User-agent: *\nDisallow: /admin/\nSitemap: {url_for('sitemap_index', _external=True)}\n",
+                    mimetype='text/plain')
+
 @app.route('/set_language/<lang>')
 def set_language_route(lang):
     """Set language and redirect back to previous page or home"""
-    if lang in ['tr', 'en', 'ar']:
+    if lang in sitemap.LANGUAGES:
         set_language(lang)
         
     # Redirect back to the page they came from or home
     return redirect(request.referrer or url_for('index'))
 
 @app.route('/ilanlar')
+@cached_page
 def ilanlar():
-    # Check if views have been updated in this session
-    if not session.get('is_view_updated', False):
-        update_views()
-        session['is_view_updated'] = True
-    
     # Get page number from query parameters (default to 1)
     page = request.args.get('page', 1, type=int)
     # Get search query from query parameters
     search_query = request.args.get('search', '', type=str)
     # Get price type query (satilik/kiralik, default to satilik)
     price_type = request.args.get('price_type', 'satilik', type=str)
+    # Facet filters: type, bed_type and a min/max price on the price_type column
+    listing_filters = filters.parse_listing_filters(request.args)
+    filter_where, filter_params = filters.filter_conditions(listing_filters)
+    # Opt-in keyset pagination: ?after=<creation_date,id> of the last row seen
+    after = parse_listing_cursor(request.args.get('after', '', type=str))
     
     # Items per page
     per_page = 8
+    page = max(page, 1)
     offset = (page - 1) * per_page
     
-    conn = get_db_connection()
+    conn = get_db()
+    # Browsing (not search) is served from the in-memory snapshot
+    snapshot = None if search_query else read_model.get_snapshot()
     
-    # Build the SQL query based on search
-    if search_query:
-        # Search by contract_id
-        count_query = '''
-            SELECT COUNT(*) as total 
-            FROM ilanlar 
-            WHERE status = 1 AND contract_id LIKE ?
-        '''
-        ads_query = '''
-            SELECT id, title, advertisement_type, img_1, sale_price, rent_price, 
-                   view, is_gold, contract_id, adres, bed_type, description
-            FROM ilanlar 
-            WHERE status = 1 AND contract_id LIKE ?
-            ORDER BY creation_date DESC 
+    # Search goes through the ilanlar_fts full-text index
+    match = search.build_match_query(search_query) if search_query else None
+    
+    # Get total count for pagination (cached until the next admin write)
+    if search_query and not match:
+        total_count = 0
+        rows = []
+    elif search_query:
+        # CROSS JOIN keeps the FTS index as the outer loop
+        source = 'ilanlar_fts CROSS JOIN ilanlar i ON i.id = ilanlar_fts.rowid'
+        search_where, search_params = filters.filter_conditions(listing_filters, 'i.')
+        where = ' AND '.join(['ilanlar_fts MATCH ?', 'i.status = 1'] + search_where)
+        params = [match] + search_params
+        total_count = get_listing_count(conn, where, params, source)
+        rows = conn.execute(f'''
+            SELECT i.id, i.title, i.advertisement_type, i.img_1, i.sale_price, i.rent_price, 
+                   i.view, i.is_gold, i.contract_id, i.adres, i.bed_type, i.description,
+                   i.creation_date, i.update_date
+            FROM {source}
+            WHERE {where}
+            ORDER BY {search.order_expression(total_count)} 
             LIMIT ? OFFSET ?
-        '''
-        search_param = f'%{search_query}%'
-        
-        # Get total count for pagination
-        total_count = conn.execute(count_query, (search_param,)).fetchone()['total']
-        
-        # Get advertisements
-        advertisements = conn.execute(ads_query, (search_param, per_page, offset)).fetchall()
+        ''', (*params, per_page + 1, offset)).fetchall()
+        # Ranked results have no keyset cursor
+        after = None
+    elif snapshot is not None:
+        total_count, rows = snapshot.page(listing_filters, after, offset, per_page + 1)
     else:
-        # No search, get all active advertisements
-        count_query = '''
-            SELECT COUNT(*) as total 
-            FROM ilanlar 
-            WHERE status = 1
-        '''
-        ads_query = '''
+        # Equality facets use the (status, type/bed_type, creation_date) indexes
+        where = ' AND '.join(['status = 1'] + filter_where)
+        total_count = get_listing_count(conn, where, filter_params)
+        ads_query = f'''
             SELECT id, title, advertisement_type, img_1, sale_price, rent_price, 
-                   view, is_gold, contract_id, adres, bed_type, description
+                   view, is_gold, contract_id, adres, bed_type, description, creation_date, update_date
             FROM ilanlar 
-            WHERE status = 1 
-            ORDER BY creation_date DESC 
-            LIMIT ? OFFSET ?
+            WHERE {where}{' AND (creation_date, id) < (?, ?)' if after else ''}
+            ORDER BY creation_date DESC, id DESC 
+            LIMIT ?{'' if after else ' OFFSET ?'}
         '''
-        
-        # Get total count for pagination
-        total_count = conn.execute(count_query).fetchone()['total']
-        
-        # Get advertisements
-        advertisements = conn.execute(ads_query, (per_page, offset)).fetchall()
+        if after:
+            # Seek straight to the cursor through idx_ilanlar_status_creation
+            rows = conn.execute(ads_query, (*filter_params, *after, per_page + 1)).fetchall()
+        else:
+            rows = conn.execute(ads_query, (*filter_params, per_page + 1, offset)).fetchall()
     
-    conn.close()
+    # The extra row only tells us whether there is a next page
+    advertisements = rows[:per_page]
+    next_cursor = None
+    if len(rows) > per_page:
+        last = advertisements[-1]
+        next_cursor = f"{last['creation_date']},{last['id']}"
     
     # Calculate pagination info
     total_pages = (total_count + per_page - 1) // per_page
     has_prev = page > 1
     has_next = page < total_pages
     
-    return render_template('ilanlar.html', 
+    # Facet counts for the filter bar (cached per content version)
+    facets = filters.get_facets(conn, price_type)
+    # Only explicitly chosen filters are carried into pager and facet links
+    filter_args = {name: request.args[name] for name in filters.FILTER_ARGS
+                   if request.args.get(name)}
+    if search_query:
+        filter_args['search'] = search_query
+    
+    # The count changes the pager and facets span all listings, so both
+    # are part of the validator too
+    etag, last_modified = page_validators(advertisements, dated=False)
+    etag = f'{etag}-{total_count}-{get_content_version()}'
+    not_modified = not_modified_response(etag, last_modified)
+    if not_modified:
+        return not_modified
+    
+    images.load_srcsets(ad['img_1'] for ad in advertisements)
+    html = render_template('ilanlar.html', 
                          advertisements=advertisements,
                          page=page,
                          total_pages=total_pages,
@@ -516,27 +724,40 @@ def ilanlar():
                          has_next=has_next,
                          search_query=search_query,
                          price_type=price_type,
-                         total_count=total_count)
+                         total_count=total_count,
+                         listing_filters=listing_filters,
+                         filter_args=filter_args,
+                         facets=facets,
+                         cursor_mode=after is not None,
+                         next_cursor=next_cursor)
+    return set_validators(html, etag, last_modified)
 
 @app.route('/ilanlar/<id>')
+@view_counter.count_views
+@cached_page
 def ilan_detay(id):
     # Get price type query (satilik/kiralik, default to satilik)
     price_type = request.args.get('price_type', 'satilik', type=str)
     
-    conn = get_db_connection()
+    conn = get_db()
     
     # Get advertisement by ID
     advertisement = conn.execute('''
         SELECT * FROM ilanlar WHERE id = ? AND status = 1
     ''', (id,)).fetchone()
     
-    conn.close()
-    
     if not advertisement:
         flash('İlan bulunamadı!', 'error')
         return redirect(url_for('ilanlar'))
     
-    return render_template('ilan_detay.html', advertisement=advertisement, price_type=price_type)
+    etag, last_modified = page_validators([advertisement])
+    not_modified = not_modified_response(etag, last_modified)
+    if not_modified:
+        return not_modified
+    
+    images.load_srcsets(advertisement[column] for column in ('img_1', 'img_2', 'img_3'))
+    html = render_template('ilan_detay.html', advertisement=advertisement, price_type=price_type)
+    return set_validators(html, etag, last_modified)
 
 # Admin routes
 @app.route('/admin/login', methods=['GET', 'POST'])
@@ -570,7 +791,11 @@ def admin_dashboard():
 @login_required
 def api_advertisements():
     """API endpoint for DataTables to fetch advertisements"""
-    conn = get_db_connection()
+    # DataTables sends 'draw' when serverSide is enabled
+    if 'draw' in request.args:
+        return api_advertisements_page()
+    
+    conn = get_db()
     advertisements = conn.execute('''
         SELECT id, title, advertisement_type, adres, view, is_gold, img_1, img_2, img_3,
                sale_price, rent_price, contract_id, description, description_en, 
@@ -578,7 +803,6 @@ def api_advertisements():
         FROM ilanlar 
         ORDER BY creation_date DESC
     ''').fetchall()
-    conn.close()
     
     # Convert to list of dictionaries for JSON response
     data = []
@@ -608,16 +832,124 @@ def api_advertisements():
     
     return jsonify({'data': data})
 
+# Columns the dashboard table shows, mapped to the SQL column behind them.
+# Only these are selected, sorted on or searched by the server-side endpoint.
+DATATABLES_COLUMNS = {
+    'id': 'id',
+    'title': 'title',
+    'advertisement_type': 'advertisement_type',
+    'is_gold': 'is_gold',
+    'sale_price': 'sale_price',
+    'rent_price': 'rent_price',
+    'contract_id': 'contract_id',
+    'bed_type': 'bed_type',
+    'status': 'status',
+    'creation_date': 'creation_date'
+}
+DATATABLES_SEARCH_COLUMNS = ('title', 'contract_id', 'advertisement_type', 'bed_type')
+DATATABLES_MAX_LENGTH = 500
+
+def api_advertisements_page():
+    """Serve one page of the DataTables server-side processing protocol"""
+    args = request.args
+    draw = args.get('draw', 0, type=int)
+    start = max(args.get('start', 0, type=int), 0)
+    length = args.get('length', 25, type=int)
+    if length < 0 or length > DATATABLES_MAX_LENGTH:
+        # "All" (-1) is capped so one request can't dump the whole table
+        length = DATATABLES_MAX_LENGTH
+    search_value = args.get('search[value]', '', type=str).strip()
+    
+    # ORDER BY only whitelisted columns, in the order DataTables requested
+    order_by = []
+    i = 0
+    while f'order[{i}][column]' in args:
+        column_index = args.get(f'order[{i}][column]', type=int)
+        column_name = args.get(f'columns[{column_index}][data]', '')
+        direction = 'ASC' if args.get(f'order[{i}][dir]') == 'asc' else 'DESC'
+        if column_name in DATATABLES_COLUMNS:
+            order_by.append(f'{DATATABLES_COLUMNS[column_name]} {direction}')
+        i += 1
+    if not order_by:
+        order_by.append('creation_date DESC')
+    order_by.append('id DESC')
+    
+    where = ''
+    params = []
+    if search_value:
+        where = 'WHERE ' + ' OR '.join(f'{col} LIKE ?' for col in DATATABLES_SEARCH_COLUMNS)
+        params = [f'%{search_value}%'] * len(DATATABLES_SEARCH_COLUMNS)
+    
+    conn = get_db()
+    records_total = conn.execute('SELECT COUNT(*) FROM ilanlar').fetchone()[0]
+    if search_value:
+        records_filtered = conn.execute(f'SELECT COUNT(*) FROM ilanlar {where}', params).fetchone()[0]
+    else:
+        records_filtered = records_total
+    
+    rows = conn.execute(f'''
+        SELECT {', '.join(DATATABLES_COLUMNS.values())}
+        FROM ilanlar 
+        {where}
+        ORDER BY {', '.join(order_by)}
+        LIMIT ? OFFSET ?
+    ''', (*params, length, start)).fetchall()
+    
+    data = []
+    for ad in rows:
+        row = dict(ad)
+        row['is_gold'] = bool(row['is_gold'])
+        row['status'] = bool(row['status'])
+        data.append(row)
+    
+    return jsonify({
+        'draw': draw,
+        'recordsTotal': records_total,
+        'recordsFiltered': records_filtered,
+        'data': data
+    })
+
+@app.route('/admin/export')
+@login_required
+def export_advertisements():
+    """Stream all advertisements as CSV or NDJSON"""
+    fmt = request.args.get('format', 'csv', type=str)
+    if fmt not in export.EXPORT_FORMATS:
+        return jsonify({'success': False, 'message': 'Unsupported format'}), 400
+    
+    chunks = export.iter_export(
+        fmt,
+        status=request.args.get('status', None, type=int),
+        ad_type=request.args.get('type') or None,
+        date_from=request.args.get('from') or None,
+        date_to=request.args.get('to') or None
+    )
+    filename = f"ilanlar-{datetime.now().strftime('%Y%m%d%H%M%S')}.{fmt}"
+    mimetype = 'text/csv' if fmt == 'csv' else 'application/x-ndjson'
+    return Response(stream_with_context(chunks), mimetype=mimetype,
+                    headers={'Content-Disposition': f'attachment; filename={filename}'})
+
+@app.route('/admin/metrics')
+def admin_metrics():
+    """This worker's metrics in Prometheus text format"""
+    # Scrapers authenticate with METRICS_TOKEN as a bearer token; people
+    # with an admin session can look too
+    token = app.config.get('METRICS_TOKEN')
+    authorization = request.headers.get('Authorization', '')
+    if not (token and hmac.compare_digest(authorization, f'Bearer {token}')) \
+            and 'admin_logged_in' not in session:
+        return redirect(url_for('admin_login'))
+    return Response(metrics.render_prometheus(), mimetype=metrics.PROMETHEUS_CONTENT_TYPE)
+
 @app.route('/admin/api/advertisement/<int:ad_id>/toggle_status', methods=['POST'])
 @login_required
 def toggle_advertisement_status(ad_id):
     """Toggle advertisement status (active/inactive)"""
-    conn = get_db_connection()
+    conn = get_db()
     
     # Get current status
     current = conn.execute('SELECT status FROM ilanlar WHERE id = ?', (ad_id,)).fetchone()
     if not current:
-        conn.close()
         return jsonify({'success': False, 'message': 'Advertisement not found'}), 404
     
     # Toggle status
@@ -627,8 +959,8 @@ def toggle_advertisement_status(ad_id):
         SET status = ?, update_date = CURRENT_TIMESTAMP 
         WHERE id = ?
     ''', (new_status, ad_id))
+    invalidate_listing_caches(conn)
     conn.commit()
-    conn.close()
     
     return jsonify({'success': True, 'new_status': bool(new_status)})
 
@@ -636,7 +968,7 @@ def toggle_advertisement_status(ad_id):
 @login_required
 def edit_advertisement(ad_id):
     """Edit advertisement"""
-    conn = get_db_connection()
+    conn = get_db()
     
     if request.method == 'POST':
         # Get current advertisement data
@@ -646,39 +978,32 @@ def edit_advertisement(ad_id):
         img_1_path = current_ad['img_1']  # Keep existing if no new upload
         img_2_path = current_ad['img_2']
         img_3_path = current_ad['img_3']
+        # Uploads left without references, deleted by the sweeper
+        released = []
         
         # Process image uploads
         if 'img_1' in request.files and request.files['img_1'].filename != '':
             new_path = save_uploaded_file(request.files['img_1'])
             if new_path:
-                # Delete old file if it exists and is in upload folder
-                if img_1_path and img_1_path.startswith('user_custom_upload/'):
-                    try:
-                        os.remove(img_1_path)
-                    except:
-                        pass
+                # Drop this listing's reference to the old upload
+                if uploads.release_upload(conn, img_1_path):
+                    released.append(img_1_path)
                 img_1_path = new_path
         
         if 'img_2' in request.files and request.files['img_2'].filename != '':
             new_path = save_uploaded_file(request.files['img_2'])
             if new_path:
-                # Delete old file if it exists and is in upload folder
-                if img_2_path and img_2_path.startswith('user_custom_upload/'):
-                    try:
-                        os.remove(img_2_path)
-                    except:
-                        pass
+                # Drop this listing's reference to the old upload
+                if uploads.release_upload(conn, img_2_path):
+                    released.append(img_2_path)
                 img_2_path = new_path
         
         if 'img_3' in request.files and request.files['img_3'].filename != '':
             new_path = save_uploaded_file(request.files['img_3'])
             if new_path:
-                # Delete old file if it exists and is in upload folder
-                if img_3_path and img_3_path.startswith('user_custom_upload/'):
-                    try:
-                        os.remove(img_3_path)
-                    except:
-                        pass
+                # Drop this listing's reference to the old upload
+                if uploads.release_upload(conn, img_3_path):
+                    released.append(img_3_path)
                 img_3_path = new_path
         
         # Update advertisement
@@ -707,15 +1032,17 @@ def edit_advertisement(ad_id):
             request.form['bed_type'],
             ad_id
         ))
+        invalidate_listing_caches(conn)
         conn.commit()
-        conn.close()
+        if released:
+            # Queued in the same transaction; the sweeper deletes them now
+            sweeper.wake()
         
         flash('Advertisement updated successfully!', 'success')
         return redirect(url_for('admin_dashboard'))
     
     # Get advertisement data for editing
     advertisement = conn.execute('SELECT * FROM ilanlar WHERE id = ?', (ad_id,)).fetchone()
-    conn.close()
     
     if not advertisement:
         flash('Advertisement not found!', 'error')
@@ -727,38 +1054,94 @@ def edit_advertisement(ad_id):
 @login_required
 def delete_advertisement(ad_id):
     """Delete advertisement"""
-    conn = get_db_connection()
+    conn = get_db()
     
     # Get advertisement data to check if it exists and get image paths
     advertisement = conn.execute('SELECT img_1, img_2, img_3 FROM ilanlar WHERE id = ?', (ad_id,)).fetchone()
     
     if not advertisement:
-        conn.close()
         flash('Advertisement not found!', 'error')
         return redirect(url_for('admin_dashboard'))
     
-    # Delete associated image files if they exist in upload folder
-    for img_path in [advertisement['img_1'], advertisement['img_2'], advertisement['img_3']]:
-        if img_path and img_path.startswith('user_custom_upload/'):
-            try:
-                os.remove(img_path)
-            except:
-                pass  # File might not exist, continue anyway
+    # Release the listing's uploads; files shared with other listings stay
+    released = [img_path for img_path in
+                [advertisement['img_1'], advertisement['img_2'], advertisement['img_3']]
+                if uploads.release_upload(conn, img_path)]
     
     # Delete the advertisement from database
     conn.execute('DELETE FROM ilanlar WHERE id = ?', (ad_id,))
+    invalidate_listing_caches(conn)
     conn.commit()
-    conn.close()
+    if released:
+        sweeper.wake()
     
     flash('Advertisement deleted successfully!', 'success')
     return redirect(url_for('admin_dashboard'))
 
+# Batch actions: action -> (column, value) for updates, None for delete
+BATCH_ACTIONS = {
+    'activate': ('status', 1),
+    'deactivate': ('status', 0),
+    'set_gold': ('is_gold', 1),
+    'unset_gold': ('is_gold', 0),
+    'delete': None,
+}
+BATCH_MAX_IDS = 1000
+
+@app.route('/admin/api/advertisements/batch', methods=['POST'])
+@login_required
+def batch_advertisements():
+    """Apply one action to many advertisements in a single transaction"""
+    payload = request.get_json(silent=True) or {}
+    action = payload.get('action')
+    ids = payload.get('ids')
+    if action not in BATCH_ACTIONS:
+        return jsonify({'success': False, 'message': 'Unknown action'}), 400
+    if not isinstance(ids, list) or not ids or len(ids) > BATCH_MAX_IDS:
+        return jsonify({'success': False, 'message': f'Send between 1 and {BATCH_MAX_IDS} ids'}), 400
+    try:
+        ids = list(dict.fromkeys(int(ad_id) for ad_id in ids))
+    except (TypeError, ValueError):
+        return jsonify({'success': False, 'message': 'Ids must be integers'}), 400
+    id_list = json.dumps(ids)
+    
+    conn = get_db()
+    found = {row['id']: row for row in conn.execute('''
+        SELECT id, img_1, img_2, img_3 FROM ilanlar
+        WHERE id IN (SELECT value FROM json_each(?))
+    ''', (id_list,))}
+    
+    released = []
+    if BATCH_ACTIONS[action] is None:
+        # Release every deleted listing's uploads; shared files stay
+        for row in found.values():
+            released += [img_path for img_path in (row['img_1'], row['img_2'], row['img_3'])
+                         if uploads.release_upload(conn, img_path)]
+        conn.execute('DELETE FROM ilanlar WHERE id IN (SELECT value FROM json_each(?))', (id_list,))
+    else:
+        column, value = BATCH_ACTIONS[action]
+        conn.execute(f'''
+            UPDATE ilanlar
+            SET {column} = ?, update_date = CURRENT_TIMESTAMP
+            WHERE id IN (SELECT value FROM json_each(?))
+        ''', (value, id_list))
+    if found:
+        invalidate_listing_caches(conn)
+    conn.commit()
+    if released:
+        sweeper.wake()
+    
+    results = [{'id': ad_id, 'success': True} if ad_id in found
+               else {'id': ad_id, 'success': False, 'message': 'Advertisement not found'}
+               for ad_id in ids]
+    return jsonify({'success': True, 'action': action, 'affected': len(found), 'results': results})
+
 @app.route('/admin/advertisement/add', methods=['GET', 'POST'])
 @login_required
 def add_advertisement():
     """Add new advertisement"""
     if request.method == 'POST':
-        conn = get_db_connection()
+        conn = get_db()
         
         # Handle image uploads
         img_1_path = None
@@ -808,15 +1191,15 @@ def add_advertisement():
             request.form['deed'],
             request.form['bed_type']
         ))
+        invalidate_listing_caches(conn)
         conn.commit()
-        conn.close()
         
         flash('Advertisement added successfully!', 'success')
         return redirect(url_for('admin_dashboard'))
     
     return render_template('admin/add_advertisement.html')
 
-@app.route('/user_custom_upload/<filename>')
+@app.route('/user_custom_upload/<path:filename>')
 def uploaded_file(filename):
     """Serve uploaded files"""
     return send_from_directory(app.config['UPLOAD_FOLDER'], filename)
@@ -0,0 +1,245 @@
+import asyncio
+import io
+import mimetypes
+import os
+import stat
+import sys
+import zlib
+from datetime import datetime, timezone
+
+from flask import g
+from werkzeug.exceptions import HTTPException
+from werkzeug.http import http_date, is_resource_modified, quote_etag
+from werkzeug.security import safe_join
+
+from app import app, apply_language_param, get_language
+from async_db import db
+from cache import response_cache
+
+# ASGI entry point: `uvicorn asgi:application` (or any ASGI server).
+#
+# Public pages found in the response cache are answered on the event loop
+# and uploads are streamed from it; everything else runs Flask's normal
+# request handling on the database threads. Buffered bodies (every rendered
+# page) are sent from the event loop, so a slow client holds a socket, not
+# a thread.
+
+# Pages whose response-cache hits need no blocking I/O
+ASYNC_PAGES = ('index', 'ilanlar', 'ilan_detay')
+# Bytes per read when streaming an upload
+FILE_CHUNK_SIZE = 64 * 1024
+
+def build_environ(scope, body):
+    """WSGI environ for an ASGI HTTP scope and its (already read) body"""
+    server = scope.get('server') or ('localhost', 80)
+    client = scope.get('client') or ('', 0)
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        # WSGI carries paths as latin-1 decoded bytes
+        'SCRIPT_NAME': scope.get('root_path', '').encode('utf-8').decode('latin-1'),
+        'PATH_INFO': scope['path'].encode('utf-8').decode('latin-1'),
+        'QUERY_STRING': scope['query_string'].decode('latin-1'),
+        'SERVER_NAME': server[0],
+        'SERVER_PORT': str(server[1]),
+        'SERVER_PROTOCOL': f"HTTP/{scope.get('http_version', '1.1')}",
+        'REMOTE_ADDR': client[0],
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': io.BytesIO(body),
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': True,
+        'wsgi.run_once': False,
+    }
+    for name, value in scope['headers']:
+        name = name.decode('latin-1').upper().replace('-', '_')
+        value = value.decode('latin-1')
+        if name in ('CONTENT_TYPE', 'CONTENT_LENGTH'):
+            environ[name] = value
+            continue
+        key = f'HTTP_{name}'
+        if key in environ:
+            # HTTP/2 clients may split cookies over several header lines
+            value = f"{environ[key]}{'; ' if key == 'HTTP_COOKIE' else ','}{value}"
+        environ[key] = value
+    # The body is already read, chunked or not
+    environ['CONTENT_LENGTH'] = str(len(body))
+    return environ
+
+async def read_body(receive, limit):
+    """Request body, read up to one byte past limit (Flask then answers 413)"""
+    chunks = []
+    size = 0
+    while True:
+        message = await receive()
+        if message['type'] == 'http.disconnect':
+            break
+        chunk = message.get('body', b'')
+        chunks.append(chunk)
+        size += len(chunk)
+        if not message.get('more_body') or (limit is not None and size > limit):
+            break
+    return b''.join(chunks)
+
+def dispatch():
+    """Flask's handling of the current request context (wsgi_app without the push)"""
+    try:
+        return app.full_dispatch_request()
+    except Exception as e:
+        return app.handle_exception(e)
+
+def _start_message(status, headers):
+    return {
+        'type': 'http.response.start',
+        'status': int(status.split(' ', 1)[0]),
+        'headers': [(name.lower().encode('latin-1'), value.encode('latin-1')) for name, value in headers],
+    }
+
+def respond(environ, loop, send):
+    """Handle a request on a database thread, like wsgi_app.
+
+    Returns (start message, body) for a buffered response, or None once a
+    streamed one (sitemaps, exports) has been sent: its generator holds a
+    cursor of this thread's connection, so it is pulled here, each chunk
+    waiting for the client.
+    """
+    ctx = app.request_context(environ)
+    ctx.push()
+    try:
+        response = dispatch()
+        app_iter, status, headers = response.get_wsgi_response(environ)
+        try:
+            if response.is_sequence and not response.direct_passthrough:
+                return _start_message(status, headers), b''.join(app_iter)
+            asyncio.run_coroutine_threadsafe(send(_start_message(status, headers)), loop).result()
+            for chunk in app_iter:
+                if chunk:
+                    asyncio.run_coroutine_threadsafe(
+                        send({'type': 'http.response.body', 'body': chunk, 'more_body': True}), loop).result()
+            asyncio.run_coroutine_threadsafe(send({'type': 'http.response.body', 'body': b''}), loop).result()
+            return None
+        finally:
+            close = getattr(app_iter, 'close', None)
+            if close is not None:
+                close()
+    finally:
+        ctx.pop()
+
+async def cached_response(environ):
+    """(start message, body) of a page answered from the response cache, or None.
+
+    The content version, and with RESPONSE_CACHE_DIR the disk entry, are
+    read on a database thread. The entry found is handed to the view's
+    cache wrapper, so the view itself never runs on the event loop.
+    """
+    version = await db.content_version()
+    ctx = app.request_context(environ)
+    ctx.push()
+    try:
+        g.content_version = version
+        # ?lang= (the sitemap alternates) selects the cached variant
+        apply_language_param()
+        key = response_cache.make_key(get_language())
+        hit = response_cache.memory.get(key)
+        if hit is None and response_cache.shared is not None:
+            hit = await db.call(response_cache.get, key)
+        if hit is None:
+            return None
+        g.response_cache_hit = (key, hit)
+        response = dispatch()
+        app_iter, status, headers = response.get_wsgi_response(environ)
+        return _start_message(status, headers), b''.join(app_iter)
+    finally:
+        ctx.pop()
+
+async def send_buffered(send, result):
+    start, body = result
+    await send(start)
+    await send({'type': 'http.response.body', 'body': body})
+
+async def send_upload(send, filename, environ):
+    """Async variant of uploaded_file: stat and read on the database threads.
+
+    Returns False, having sent nothing, when there is no such file.
+    """
+    directory = os.path.join(app.root_path, app.config['UPLOAD_FOLDER'])
+    path = safe_join(directory, filename)
+    try:
+        info = await db.call(os.stat, path) if path else None
+    except OSError:
+        info = None
+    if info is None or not stat.S_ISREG(info.st_mode):
+        return False
+
+    # Same validators as send_from_directory
+    last_modified = datetime.fromtimestamp(info.st_mtime, timezone.utc)
+    etag = f"{info.st_mtime}-{info.st_size}-{zlib.adler32(path.encode('utf-8')) & 0xffffffff}"
+    headers = [
+        (b'content-disposition', f'inline; filename={os.path.basename(path)}'.encode('utf-8')),
+        (b'content-type', (mimetypes.guess_type(path)[0] or 'application/octet-stream').encode('latin-1')),
+        (b'etag', quote_etag(etag).encode('latin-1')),
+        (b'last-modified', http_date(last_modified).encode('latin-1')),
+        (b'cache-control', b'no-cache'),
+    ]
+    if not is_resource_modified(environ, etag=etag, last_modified=last_modified):
+        await send({'type': 'http.response.start', 'status': 304, 'headers': headers})
+        await send({'type': 'http.response.body', 'body': b''})
+        return True
+    headers.append((b'content-length', str(info.st_size).encode('latin-1')))
+    await send({'type': 'http.response.start', 'status': 200, 'headers': headers})
+    if environ['REQUEST_METHOD'] == 'HEAD':
+        await send({'type': 'http.response.body', 'body': b''})
+        return True
+    f = await db.call(open, path, 'rb')
+    try:
+        while True:
+            chunk = await db.call(f.read, FILE_CHUNK_SIZE)
+            if not chunk:
+                break
+            await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+    finally:
+        await db.call(f.close)
+    await send({'type': 'http.response.body', 'body': b''})
+    return True
+
+def _match(environ):
+    """(endpoint, view args) the request routes to, or (None, None)"""
+    try:
+        return app.url_map.bind_to_environ(environ).match()
+    except HTTPException:
+        return None, None
+
+async def handle_http(scope, receive, send):
+    body = await read_body(receive, app.config.get('MAX_CONTENT_LENGTH'))
+    environ = build_environ(scope, body)
+    method = environ['REQUEST_METHOD']
+    endpoint, view_args = _match(environ)
+    if endpoint == 'uploaded_file' and method in ('GET', 'HEAD'):
+        if await send_upload(send, view_args['filename'], environ):
+            return
+    elif endpoint in ASYNC_PAGES and method == 'GET' and response_cache.enabled:
+        result = await cached_response(environ)
+        if result is not None:
+            return await send_buffered(send, result)
+    result = await db.call(respond, environ, asyncio.get_running_loop(), send)
+    if result is not None:
+        await send_buffered(send, result)
+
+async def lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            db.shutdown()
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+async def application(scope, receive, send):
+    """ASGI 3 application serving the Flask app"""
+    if scope['type'] == 'http':
+        await handle_http(scope, receive, send)
+    elif scope['type'] == 'lifespan':
+        await lifespan(receive, send)
+    else:
+        raise RuntimeError(f"Unsupported ASGI scope type: {scope['type']}")
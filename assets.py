@@ -0,0 +1,171 @@
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import posixpath
+import re
+
+import click
+from flask import request, send_from_directory, abort
+
+# Brotli is optional: without it only .gz siblings are written
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Bundles built from the assets base.html loads, in load order.
+# Paths are URLs under the static folder (static_url_path='').
+BUNDLES = {
+    'site.css': [
+        '/plugins/revslider/public/assets/css/settings.css',
+        '/plugins/tourmaster/plugins/elegant-font/style.css',
+        '/plugins/tourmaster/tourmaster.css',
+        '/css/tourmaster-style-custom.css',
+        '/plugins/goodlayers-core/plugins/combine/style.css',
+        '/plugins/goodlayers-core/include/css/page-builder.css',
+        '/css/style-core.css',
+        '/css/traveltour-style-custom.css',
+    ],
+    'site.js': [
+        '/js/jquery/jquery.js',
+        '/js/jquery/jquery-migrate.min.js',
+        '/js/jquery/ui/core.min.js',
+        '/js/jquery/ui/datepicker.min.js',
+        '/js/jquery/ui/effect.min.js',
+        '/plugins/tourmaster/tourmaster.js',
+        '/js/plugins.js',
+        '/plugins/goodlayers-core/plugins/combine/script.js',
+        '/plugins/goodlayers-core/include/js/page-builder.js',
+        '/plugins/revslider/public/assets/js/jquery.themepunch.tools.min.js',
+        '/plugins/revslider/public/assets/js/jquery.themepunch.revolution.min.js',
+        '/plugins/revslider/public/assets/js/extensions/revolution.extension.slideanims.min.js',
+        '/plugins/revslider/public/assets/js/extensions/revolution.extension.layeranimation.min.js',
+        '/plugins/revslider/public/assets/js/extensions/revolution.extension.kenburn.min.js',
+        '/plugins/revslider/public/assets/js/extensions/revolution.extension.navigation.min.js',
+        '/plugins/revslider/public/assets/js/extensions/revolution.extension.parallax.min.js',
+        '/plugins/revslider/public/assets/js/extensions/revolution.extension.actions.min.js',
+        '/plugins/revslider/public/assets/js/extensions/revolution.extension.video.min.js',
+    ],
+}
+
+DIST_DIR = 'dist'  # under the static folder, served at /dist/
+MANIFEST_NAME = 'manifest.json'
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+
+STATIC_FOLDER = 'static'
+_manifest = {}
+
+_CSS_URL = re.compile(r'url\(\s*([\'"]?)([^\'")]+)\1\s*\)')
+_CSS_COMMENT = re.compile(r'/\*.*?\*/', re.S)
+_CSS_CHARSET = re.compile(r'@charset\s+[^;]+;', re.I)
+
+def _rebase_css_urls(css, source_url):
+    """Make relative url() references absolute, since the bundle lives elsewhere"""
+    base = posixpath.dirname(source_url)
+
+    def rebase(match):
+        quote, target = match.group(1), match.group(2).strip()
+        if target.startswith(('/', 'data:', 'http:', 'https:', '#')):
+            return match.group(0)
+        # Keep ?query / #fragment suffixes (e.g. font.eot?#iefix) untouched
+        path, suffix = re.match(r'([^?#]*)(.*)', target, re.S).groups()
+        return f'url({quote}{posixpath.normpath(posixpath.join(base, path))}{suffix}{quote})'
+
+    return _CSS_URL.sub(rebase, css)
+
+def minify_css(css):
+    """Conservative CSS minification: comments and redundant whitespace"""
+    css = _CSS_COMMENT.sub('', css)
+    css = re.sub(r'\s+', ' ', css)
+    css = re.sub(r'\s*([{};])\s*', r'\1', css)
+    return css.strip()
+
+def _read(url):
+    with open(os.path.join(STATIC_FOLDER, url.lstrip('/')), encoding='utf-8', errors='replace') as f:
+        return f.read()
+
+def build_bundle(name, sources):
+    """Concatenate (and for CSS minify) a bundle's sources"""
+    if name.endswith('.css'):
+        parts = [_CSS_CHARSET.sub('', _rebase_css_urls(_read(url), url)) for url in sources]
+        return '@charset "UTF-8";' + minify_css('\n'.join(parts))
+    # Scripts are concatenated as-is; most already ship minified and a
+    # regex minifier is not safe for JavaScript
+    return '\n;\n'.join(_read(url) for url in sources) + '\n;\n'
+
+def build_assets():
+    """Write fingerprinted bundles with .gz/.br siblings and the manifest"""
+    dist_path = os.path.join(STATIC_FOLDER, DIST_DIR)
+    os.makedirs(dist_path, exist_ok=True)
+    manifest = {}
+    for name, sources in BUNDLES.items():
+        data = build_bundle(name, sources).encode('utf-8')
+        digest = hashlib.sha256(data).hexdigest()[:12]
+        stem, ext = name.rsplit('.', 1)
+        filename = f'{stem}.{digest}.{ext}'
+        target = os.path.join(dist_path, filename)
+        with open(target, 'wb') as f:
+            f.write(data)
+        with open(target + '.gz', 'wb') as f:
+            f.write(gzip.compress(data, compresslevel=9, mtime=0))
+        if brotli is not None:
+            with open(target + '.br', 'wb') as f:
+                f.write(brotli.compress(data, quality=11))
+        manifest[name] = f'/{DIST_DIR}/{filename}'
+    with open(os.path.join(dist_path, MANIFEST_NAME), 'w') as f:
+        json.dump(manifest, f, indent=2)
+    _manifest.clear()
+    _manifest.update(manifest)
+    return manifest
+
+def load_manifest():
+    """Load the build manifest, if the build step has been run"""
+    _manifest.clear()
+    try:
+        with open(os.path.join(STATIC_FOLDER, DIST_DIR, MANIFEST_NAME)) as f:
+            _manifest.update(json.load(f))
+    except (OSError, ValueError):
+        pass
+    return _manifest
+
+def asset_url(name):
+    """Fingerprinted URL of a bundle, or None to fall back to the source files"""
+    return _manifest.get(name)
+
+def serve_dist(filename):
+    """Serve a built bundle, preferring a precompressed variant"""
+    directory = os.path.join(STATIC_FOLDER, DIST_DIR)
+    if not os.path.isfile(os.path.join(directory, filename)):
+        abort(404)
+    mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+    # Highest client quality wins, Brotli on ties; q=0 means never
+    encoding = variant = None
+    quality = 0
+    for candidate, suffix in (('br', '.br'), ('gzip', '.gz')):
+        accepted = request.accept_encodings[candidate]
+        if accepted > quality and os.path.isfile(os.path.join(directory, filename + suffix)):
+            encoding, variant, quality = candidate, filename + suffix, accepted
+    filename = variant or filename
+    response = send_from_directory(directory, filename, mimetype=mimetype, max_age=31536000)
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+    response.headers['Cache-Control'] = IMMUTABLE_CACHE_CONTROL
+    response.vary.add('Accept-Encoding')
+    return response
+
+@click.command('build-assets')
+def build_assets_command():
+    """Bundle, fingerprint and precompress the site's CSS and JS."""
+    for name, url in build_assets().items():
+        click.echo(f'{name} -> {url}')
+
+def init_app(app):
+    """Load the manifest, expose asset_url() to templates and serve /dist/"""
+    global STATIC_FOLDER
+    STATIC_FOLDER = app.static_folder or STATIC_FOLDER
+    load_manifest()
+    app.add_template_global(asset_url)
+    app.add_url_rule(f'/{DIST_DIR}/<path:filename>', 'dist', serve_dist)
+    app.cli.add_command(build_assets_command)
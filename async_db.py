@@ -0,0 +1,47 @@
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+
+from database import pooled_connection, get_state
+
+# SQLite calls block; they run on this many threads, each with its own
+# pooled connection, while the event loop keeps serving other clients
+ASYNC_DB_THREADS = 8
+
+class AsyncDatabase:
+    """Awaitable access to SQLite through a small pool of connection threads"""
+
+    def __init__(self, threads=ASYNC_DB_THREADS):
+        self.threads = threads
+        self._executor = None
+
+    @property
+    def executor(self):
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.threads,
+                                                thread_name_prefix='async-db')
+        return self._executor
+
+    async def call(self, fn, *args):
+        """Run a blocking callable on a database thread"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, functools.partial(fn, *args))
+
+    async def run(self, fn, *args):
+        """Run fn(conn, *args) with the database thread's connection"""
+        return await self.call(lambda: fn(pooled_connection(), *args))
+
+    async def content_version(self):
+        """The listings content version (see cache.get_content_version)"""
+        return await self.run(lambda conn: int(get_state(conn, 'content_version', 0)))
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+
+db = AsyncDatabase()
+
+def init_app(app):
+    """Size the database thread pool from the app config"""
+    db.threads = app.config.setdefault('ASYNC_DB_THREADS', ASYNC_DB_THREADS)
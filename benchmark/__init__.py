@@ -0,0 +1,5 @@
+"""Synthetic data and load benchmarks for the listings site.
+
+    python -m benchmark generate --rows 100000 --dir bench/100k
+    python -m benchmark run --dir bench/100k --mode both -o results.json
+"""
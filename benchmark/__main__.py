@@ -0,0 +1,75 @@
+import json
+import os
+import sys
+
+import click
+
+from benchmark.generate import SIZES, generate_database
+from benchmark.runner import DEFAULT_ROUTES, ROUTES, run_benchmark
+
+def _parse_rows(value):
+    value = str(value).lower()
+    if value in SIZES:
+        return SIZES[value]
+    try:
+        return int(value.replace('_', ''))
+    except ValueError:
+        raise click.BadParameter(f"use a row count or one of {', '.join(SIZES)}")
+
+@click.group()
+def cli():
+    """Synthetic data and load benchmarks."""
+
+@cli.command()
+@click.option('--rows', default='100k', show_default=True, help='Row count or 1k / 100k / 1m')
+@click.option('--dir', 'directory', required=True, type=click.Path(file_okay=False),
+              help='Directory to write ilanlar.db into')
+@click.option('--seed', default=0, show_default=True, help='Random seed, for repeatable datasets')
+@click.option('--force', is_flag=True, help='Replace an existing database')
+def generate(rows, directory, seed, force):
+    """Generate a synthetic ilanlar.db."""
+    total = _parse_rows(rows)
+    static_folder = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'static')
+
+    def progress(done, elapsed):
+        click.echo(f"\r{done}/{total} rows ({done / elapsed:.0f} rows/s)", nl=False, err=True)
+
+    try:
+        path = generate_database(directory, total, seed=seed, static_folder=static_folder,
+                                 force=force, progress=progress)
+    except FileExistsError as e:
+        raise click.ClickException(f"{e} (use --force to replace it)")
+    click.echo(f"\nWrote {path}", err=True)
+
+@cli.command()
+@click.option('--dir', 'directory', required=True, type=click.Path(exists=True, file_okay=False),
+              help='Directory holding a generated ilanlar.db')
+@click.option('--mode', type=click.Choice(['test_client', 'http', 'asgi', 'both']), default='both', show_default=True)
+@click.option('--route', 'routes', multiple=True, type=click.Choice(ROUTES),
+              help='Route to benchmark (repeatable; default all but admin_api_full)')
+@click.option('--requests', default=500, show_default=True, help='Timed requests per route and mode')
+@click.option('--warmup', default=20, show_default=True, help='Untimed requests per route first')
+@click.option('--concurrency', default=8, show_default=True, help='HTTP client threads (ASGI: concurrent tasks)')
+@click.option('--response-cache', is_flag=True, help='Keep the full-page response cache on')
+@click.option('-o', '--output', type=click.Path(dir_okay=False), help='Write the JSON report here')
+def run(directory, mode, routes, requests, warmup, concurrency, response_cache, output):
+    """Benchmark the routes against a generated database and report JSON."""
+    modes = ('test_client', 'http') if mode == 'both' else (mode,)
+    output = os.path.abspath(output) if output else None
+
+    def progress(result):
+        latency = result['latency_ms']
+        click.echo(f"{result['mode']:<11} {result['route']:<16} {result['rps']:>8} req/s  "
+                   f"p50 {latency['p50']}ms  p99 {latency['p99']}ms  errors {result['errors']}", err=True)
+
+    report = run_benchmark(os.path.abspath(directory), routes or DEFAULT_ROUTES, modes, requests,
+                           warmup, concurrency, response_cache, progress)
+    text = json.dumps(report, indent=2, ensure_ascii=False)
+    if output:
+        with open(output, 'w', encoding='utf-8') as f:
+            f.write(text + '\n')
+    else:
+        click.echo(text)
+
+if __name__ == '__main__':
+    sys.exit(cli())
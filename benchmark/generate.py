@@ -0,0 +1,150 @@
+import os
+import random
+import sqlite3
+import time
+from datetime import datetime, timedelta, timezone
+
+from database import DATABASE_NAME, migrate
+from search import fts_backfill_sql
+
+# Named dataset sizes accepted by --rows
+SIZES = {'1k': 1000, '100k': 100000, '1m': 1000000}
+
+INSERT_BATCH_SIZE = 10000
+
+CITIES = {
+    'İstanbul': ['Kadıköy', 'Beşiktaş', 'Üsküdar', 'Şişli', 'Sarıyer', 'Ataşehir', 'Beylikdüzü'],
+    'İzmir': ['Karşıyaka', 'Bornova', 'Çeşme', 'Urla', 'Buca'],
+    'Antalya': ['Muratpaşa', 'Konyaaltı', 'Alanya', 'Kaş', 'Side'],
+    'Yalova': ['Çınarcık', 'Termal', 'Altınova', 'Armutlu'],
+    'Muğla': ['Bodrum', 'Fethiye', 'Marmaris', 'Datça'],
+    'Bursa': ['Nilüfer', 'Osmangazi', 'Mudanya', 'Gemlik'],
+}
+ADVERTISEMENT_TYPES = [('konut', 70), ('arsa', 15), ('devremülk', 15)]
+BED_TYPES = ['Stüdyo', '1+1', '2+1', '3+1', '4+1', '5+1']
+DEEDS = ['Kat Mülkiyeti', 'Kat İrtifakı', 'Hisseli Tapu', 'Arsa Tapulu']
+
+TITLE_ADJECTIVES = ['Deniz Manzaralı', 'Bahçeli', 'Havuzlu', 'Site İçinde', 'Merkezi', 'Sıfır',
+                    'Eşyalı', 'Asansörlü', 'Doğa İçinde', 'Metroya Yakın', 'Geniş', 'Lüks']
+TITLE_NOUNS = {'konut': ['Daire', 'Villa', 'Rezidans', 'Müstakil Ev', 'Dubleks'],
+               'arsa': ['Arsa', 'İmarlı Arsa', 'Tarla', 'Zeytinlik'],
+               'devremülk': ['Devremülk', 'Termal Devremülk', 'Tatil Köyü Devremülk']}
+
+DESCRIPTIONS = {
+    'tr': ['{city} {district} bölgesinde {bed} {noun}.', 'Toplu taşımaya ve okullara yürüme mesafesinde.',
+           'Otoparklı, güvenlikli ve bakımlı bir site.', 'Güney cepheli, bol ışık alan ferah bir yapı.',
+           'Krediye uygun, takasa açık.', 'Denize {distance} metre mesafede.'],
+    'en': ['{bed} {noun_en} in {district}, {city}.', 'Walking distance to public transport and schools.',
+           'Secure, well-kept complex with parking.', 'South-facing and full of daylight.',
+           'Eligible for a mortgage.', '{distance} metres from the sea.'],
+    'ar': ['{bed} في {district}، {city}.', 'على مسافة قريبة من المواصلات والمدارس.',
+           'مجمع آمن مع موقف سيارات.', 'واجهة جنوبية ومشمسة.', 'مناسب للتمويل العقاري.',
+           'على بعد {distance} متر من البحر.'],
+}
+NOUNS_EN = {'konut': 'apartment', 'arsa': 'land plot', 'devremülk': 'timeshare'}
+
+def image_urls(static_folder):
+    """Listing images that exist in the static folder, as stored in ilanlar"""
+    folder = os.path.join(static_folder, 'devremulk')
+    try:
+        names = sorted(os.listdir(folder))
+    except OSError:
+        return []
+    return [f'/devremulk/{name}' for name in names if name.lower().endswith(('.jpg', '.jpeg', '.png', '.webp'))]
+
+def _description(rng, lang, **values):
+    first, *rest = DESCRIPTIONS[lang]
+    return ' '.join([first] + rng.sample(rest, 3)).format(**values)
+
+def make_listing(rng, index, now, images):
+    """One synthetic ilanlar row, as a tuple in INSERT column order"""
+    ad_type = rng.choices([t for t, _ in ADVERTISEMENT_TYPES], [w for _, w in ADVERTISEMENT_TYPES])[0]
+    city = rng.choice(list(CITIES))
+    district = rng.choice(CITIES[city])
+    noun = rng.choice(TITLE_NOUNS[ad_type])
+    bed = rng.choice(BED_TYPES) if ad_type == 'konut' else ''
+    values = {'city': city, 'district': district, 'bed': bed, 'noun': noun,
+              'noun_en': NOUNS_EN[ad_type], 'distance': rng.randrange(50, 2000, 50)}
+
+    # Most listings are for sale, some for rent, a few both
+    kind = rng.random()
+    sale_price = round(rng.lognormvariate(15.2, 0.7), -3) if kind < 0.75 or kind > 0.95 else None
+    rent_price = round(rng.lognormvariate(10, 0.6), -2) if kind >= 0.75 else None
+
+    created = now - timedelta(seconds=rng.randrange(3 * 365 * 86400))
+    updated = created + timedelta(seconds=rng.randrange(max(1, int((now - created).total_seconds()))))
+    picked = rng.sample(images, min(3, len(images))) if images else []
+    picked += [None] * (3 - len(picked))
+
+    return (
+        f"{district} {rng.choice(TITLE_ADJECTIVES)} {bed} {noun}".replace('  ', ' '),
+        ad_type,
+        f"{district}, {city}",
+        int(rng.paretovariate(1.2) * 20),
+        1 if rng.random() < 0.05 else 0,
+        picked[0], picked[1], picked[2],
+        sale_price,
+        rent_price,
+        f"TP{index:07d}",
+        _description(rng, 'tr', **values),
+        _description(rng, 'en', **values),
+        _description(rng, 'ar', **values),
+        rng.choice(DEEDS) if ad_type != 'devremülk' else '',
+        bed,
+        0 if rng.random() < 0.1 else 1,
+        created.strftime('%Y-%m-%d %H:%M:%S'),
+        updated.strftime('%Y-%m-%d %H:%M:%S'),
+    )
+
+def generate_database(directory, rows, seed=0, static_folder='static', force=False, progress=None):
+    """Create <directory>/ilanlar.db with `rows` synthetic listings; returns its path"""
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, DATABASE_NAME)
+    if os.path.exists(path):
+        if not force:
+            raise FileExistsError(f'{path} already exists')
+        for suffix in ('', '-wal', '-shm'):
+            if os.path.exists(path + suffix):
+                os.remove(path + suffix)
+
+    conn = sqlite3.connect(path, isolation_level=None)
+    conn.execute('PRAGMA journal_mode = WAL')
+    migrate(conn)
+    # Throwaway data: skip fsyncs while loading
+    conn.execute('PRAGMA synchronous = OFF')
+
+    # Per-row FTS maintenance dominates a bulk load; index everything in
+    # one pass at the end instead, then put the trigger back
+    fts_trigger = conn.execute(
+        "SELECT sql FROM sqlite_master WHERE type = 'trigger' AND name = 'ilanlar_fts_insert'").fetchone()[0]
+    conn.execute('DROP TRIGGER ilanlar_fts_insert')
+
+    rng = random.Random(seed)
+    images = image_urls(static_folder)
+    now = datetime.now(timezone.utc).replace(tzinfo=None, microsecond=0)
+    started = time.perf_counter()
+    for start in range(0, rows, INSERT_BATCH_SIZE):
+        batch = [make_listing(rng, i, now, images)
+                 for i in range(start, min(start + INSERT_BATCH_SIZE, rows))]
+        conn.execute('BEGIN')
+        conn.executemany('''
+            INSERT INTO ilanlar
+            (title, advertisement_type, adres, view, is_gold, img_1, img_2, img_3,
+             sale_price, rent_price, contract_id, description, description_en,
+             description_ar, deed, bed_type, status, creation_date, update_date)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', batch)
+        conn.execute('COMMIT')
+        if progress:
+            progress(start + len(batch), time.perf_counter() - started)
+
+    conn.execute('BEGIN')
+    conn.execute(fts_backfill_sql())
+    conn.execute(fts_trigger)
+    conn.execute('COMMIT')
+
+    conn.execute('ANALYZE')
+    conn.execute("INSERT INTO ilanlar_fts (ilanlar_fts) VALUES ('optimize')")
+    conn.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+    conn.close()
+    return path
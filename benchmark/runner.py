@@ -0,0 +1,301 @@
+import asyncio
+import http.client
+import itertools
+import os
+import platform
+import sqlite3
+import subprocess
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+from urllib.parse import quote
+
+from werkzeug.serving import WSGIRequestHandler, make_server
+
+# Benchmarked routes, in report order
+ROUTES = ('index', 'ilanlar', 'ilanlar_search', 'ilanlar_filtered', 'ilan_detay',
+          'admin_api', 'admin_api_full')
+# The legacy full JSON dump grows with the table; opt in with --route
+DEFAULT_ROUTES = tuple(route for route in ROUTES if route != 'admin_api_full')
+# Routes that need an admin session
+ADMIN_ROUTES = {'admin_api', 'admin_api_full'}
+
+SEARCH_TERMS = ('deniz', 'bahçeli villa', 'kadıköy', 'istanbul daire', 'havuzlu', 'TP00001')
+DETAIL_SAMPLE = 200
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def build_targets(conn):
+    """URLs to cycle through for each route, drawn from the benchmark database"""
+    ids = [row[0] for row in conn.execute(
+        'SELECT id FROM ilanlar WHERE status = 1 ORDER BY random() LIMIT ?', (DETAIL_SAMPLE,))]
+    return {
+        'index': ['/'],
+        'ilanlar': ['/ilanlar'] + [f'/ilanlar?page={page}' for page in (2, 5, 20, 100)],
+        'ilanlar_search': [f'/ilanlar?search={quote(term)}' for term in SEARCH_TERMS],
+        'ilanlar_filtered': ['/ilanlar?type=konut&bed_type=3%2B1',
+                             '/ilanlar?price_type=kiralik&min_price=10000&max_price=25000',
+                             '/ilanlar?type=arsa&page=3'],
+        'ilan_detay': [f'/ilanlar/{ad_id}' for ad_id in ids] or ['/ilanlar/1'],
+        'admin_api': [f'/admin/api/advertisements?draw=1&start={start}&length=25'
+                      '&order[0][column]=0&order[0][dir]=desc' for start in (0, 25, 1000)],
+        'admin_api_full': ['/admin/api/advertisements'],
+    }
+
+def percentile(ordered, pct):
+    """Nearest-rank percentile of an already sorted list"""
+    if not ordered:
+        return None
+    rank = max(1, round(pct / 100 * len(ordered)))
+    return ordered[min(rank, len(ordered)) - 1]
+
+def summarize(route, mode, latencies, statuses, errors, elapsed, concurrency):
+    """Throughput and latency percentiles (in ms) for one route and driver"""
+    ordered = sorted(latencies)
+    ms = lambda seconds: round(seconds * 1000, 3) if seconds is not None else None
+    return {
+        'route': route,
+        'mode': mode,
+        'concurrency': concurrency,
+        'requests': len(latencies),
+        'errors': errors,
+        'statuses': {str(code): count for code, count in sorted(statuses.items())},
+        'duration_s': round(elapsed, 3),
+        'rps': round(len(latencies) / elapsed, 1) if elapsed else None,
+        'latency_ms': {
+            'min': ms(ordered[0] if ordered else None),
+            'mean': ms(sum(ordered) / len(ordered) if ordered else None),
+            'p50': ms(percentile(ordered, 50)),
+            'p90': ms(percentile(ordered, 90)),
+            'p95': ms(percentile(ordered, 95)),
+            'p99': ms(percentile(ordered, 99)),
+            'max': ms(ordered[-1] if ordered else None),
+        },
+    }
+
+def admin_session_cookie(app):
+    """Signed session cookie value for a logged-in admin"""
+    serializer = app.session_interface.get_signing_serializer(app)
+    return serializer.dumps({'admin_logged_in': True})
+
+def run_test_client(app, route, urls, requests, warmup, admin):
+    """Drive a route in-process through the Flask test client"""
+    client = app.test_client()
+    if admin:
+        client.set_cookie(app.config['SESSION_COOKIE_NAME'], admin_session_cookie(app))
+    cycle = itertools.cycle(urls)
+    for _ in range(warmup):
+        client.get(next(cycle))
+
+    latencies, statuses, errors = [], {}, 0
+    started = time.perf_counter()
+    for _ in range(requests):
+        url = next(cycle)
+        t0 = time.perf_counter()
+        response = client.get(url)
+        response.get_data()
+        latencies.append(time.perf_counter() - t0)
+        statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+        if response.status_code >= 400:
+            errors += 1
+    return summarize(route, 'test_client', latencies, statuses, errors,
+                     time.perf_counter() - started, 1)
+
+class _KeepAliveHandler(WSGIRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_request(self, *args, **kwargs):
+        pass
+
+def serve(app, host='127.0.0.1', port=0):
+    """Serve the app from a threaded local server; returns (server, port)"""
+    server = make_server(host, port, app, threaded=True, request_handler=_KeepAliveHandler)
+    threading.Thread(target=server.serve_forever, name='benchmark-server', daemon=True).start()
+    return server, server.server_port
+
+def run_http(port, route, urls, requests, warmup, concurrency, cookie=None):
+    """Drive a route over HTTP with `concurrency` keep-alive client threads"""
+    headers = {'Cookie': cookie} if cookie else {}
+    lock = threading.Lock()
+    cycle = itertools.cycle(urls)
+    remaining = [warmup]
+    latencies, statuses, errors = [], {}, [0]
+
+    def next_url():
+        with lock:
+            if remaining[0] <= 0:
+                return None
+            remaining[0] -= 1
+            return next(cycle)
+
+    def worker(record):
+        conn = http.client.HTTPConnection('127.0.0.1', port, timeout=60)
+        try:
+            while True:
+                url = next_url()
+                if url is None:
+                    return
+                t0 = time.perf_counter()
+                try:
+                    conn.request('GET', url, headers=headers)
+                    response = conn.getresponse()
+                    response.read()
+                    status = response.status
+                except (OSError, http.client.HTTPException):
+                    conn.close()
+                    status = None
+                elapsed = time.perf_counter() - t0
+                if record:
+                    with lock:
+                        latencies.append(elapsed)
+                        statuses[status or 0] = statuses.get(status or 0, 0) + 1
+                        if status is None or status >= 400:
+                            errors[0] += 1
+        finally:
+            conn.close()
+
+    def run(record):
+        threads = [threading.Thread(target=worker, args=(record,)) for _ in range(concurrency)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    run(False)
+    remaining[0] = requests
+    started = time.perf_counter()
+    run(True)
+    return summarize(route, 'http', latencies, statuses, errors[0],
+                     time.perf_counter() - started, concurrency)
+
+def run_asgi(route, urls, requests, warmup, concurrency, cookie=None):
+    """Drive a route in-process through asgi.application with `concurrency` tasks"""
+    from asgi import application
+
+    headers = [(b'cookie', cookie.encode('latin-1'))] if cookie else []
+    cycle = itertools.cycle(urls)
+    latencies, statuses, errors = [], {}, [0]
+
+    async def request(url):
+        path, _, query = url.partition('?')
+        scope = {'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': 'GET',
+                 'scheme': 'http', 'path': path, 'raw_path': path.encode(), 'root_path': '',
+                 'query_string': query.encode('latin-1'), 'headers': headers,
+                 'server': ('127.0.0.1', 80), 'client': ('127.0.0.1', 0)}
+        status = []
+
+        async def receive():
+            return {'type': 'http.request', 'body': b'', 'more_body': False}
+
+        async def send(message):
+            if message['type'] == 'http.response.start':
+                status.append(message['status'])
+
+        await application(scope, receive, send)
+        return status[0]
+
+    async def worker(remaining, record):
+        while remaining[0] > 0:
+            remaining[0] -= 1
+            t0 = time.perf_counter()
+            try:
+                status = await request(next(cycle))
+            except Exception:
+                status = None
+            if record:
+                latencies.append(time.perf_counter() - t0)
+                statuses[status or 0] = statuses.get(status or 0, 0) + 1
+                if status is None or status >= 400:
+                    errors[0] += 1
+
+    async def run(count, record):
+        remaining = [count]
+        await asyncio.gather(*(worker(remaining, record) for _ in range(concurrency)))
+
+    async def main():
+        await run(warmup, False)
+        started = time.perf_counter()
+        await run(requests, True)
+        return time.perf_counter() - started
+
+    elapsed = asyncio.run(main())
+    return summarize(route, 'asgi', latencies, statuses, errors[0], elapsed, concurrency)
+
+def _git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                              text=True, cwd=PROJECT_ROOT, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def run_benchmark(directory, routes=DEFAULT_ROUTES, modes=('test_client', 'http'), requests=500,
+                  warmup=20, concurrency=8, response_cache=False, progress=None):
+    """Benchmark the app against <directory>/ilanlar.db and return the JSON report"""
+    # The app opens ilanlar.db and its upload folder relative to the cwd,
+    # so the caller's working directory is restored afterwards
+    if PROJECT_ROOT not in sys.path:
+        sys.path.insert(0, PROJECT_ROOT)
+    previous_cwd = os.getcwd()
+    os.chdir(directory)
+    try:
+        return _run_in_directory(routes, modes, requests, warmup, concurrency, response_cache, progress)
+    finally:
+        os.chdir(previous_cwd)
+
+def _run_in_directory(routes, modes, requests, warmup, concurrency, response_cache, progress):
+    os.environ.setdefault('SCHEDULER_ENABLED', '0')
+    # Background writers would outlive the run and use the restored cwd
+    os.environ.setdefault('UPLOAD_SWEEP_ENABLED', '0')
+    os.environ['RESPONSE_CACHE_ENABLED'] = '1' if response_cache else '0'
+    from app import app
+    import view_counter
+
+    conn = sqlite3.connect('ilanlar.db')
+    total_rows, active_rows = conn.execute(
+        'SELECT COUNT(*), COALESCE(SUM(status = 1), 0) FROM ilanlar').fetchone()
+    targets = build_targets(conn)
+    conn.close()
+
+    results = []
+    server = port = None
+    cookie = f"{app.config['SESSION_COOKIE_NAME']}={admin_session_cookie(app)}"
+    try:
+        for mode in modes:
+            if mode == 'http' and server is None:
+                server, port = serve(app)
+            for route in routes:
+                admin = route in ADMIN_ROUTES
+                if mode == 'test_client':
+                    result = run_test_client(app, route, targets[route], requests, warmup, admin)
+                elif mode == 'asgi':
+                    result = run_asgi(route, targets[route], requests, warmup, concurrency,
+                                      cookie if admin else None)
+                else:
+                    result = run_http(port, route, targets[route], requests, warmup, concurrency,
+                                      cookie if admin else None)
+                results.append(result)
+                if progress:
+                    progress(result)
+    finally:
+        if server is not None:
+            server.shutdown()
+        # Counted detail views go to this directory's database, not the caller's
+        view_counter.stop_flusher()
+
+    return {
+        'meta': {
+            'timestamp': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+            'revision': _git_revision(),
+            'python': platform.python_version(),
+            'sqlite': sqlite3.sqlite_version,
+            'platform': platform.platform(),
+            'rows': total_rows,
+            'active_rows': active_rows,
+            'requests_per_route': requests,
+            'warmup': warmup,
+            'concurrency': concurrency,
+            'response_cache': response_cache,
+        },
+        'results': results,
+    }
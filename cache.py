@@ -0,0 +1,206 @@
+import hashlib
+import os
+import pickle
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+
+from flask import g, request, make_response, has_app_context
+
+from database import get_db, get_state
+
+# Full-page response cache defaults (overridable through app.config)
+RESPONSE_CACHE_TTL = 300          # seconds
+RESPONSE_CACHE_MAX_ENTRIES = 512  # per worker
+
+# Response headers that must never be replayed to another client
+_UNCACHEABLE_HEADERS = {'set-cookie', 'content-length'}
+
+def get_content_version():
+    """Return the listings content version, read once per request"""
+    if 'content_version' not in g:
+        g.content_version = int(get_state(get_db(), 'content_version', 0))
+    return g.content_version
+
+def bump_content_version(conn):
+    """Invalidate every cached page in every worker (caller commits)"""
+    conn.execute('''
+        INSERT INTO app_state (key, value) VALUES ('content_version', 1)
+        ON CONFLICT(key) DO UPDATE SET value = CAST(value AS INTEGER) + 1
+    ''')
+    if has_app_context():
+        g.pop('content_version', None)
+
+class MemoryBackend:
+    """Thread-safe in-process LRU with per-entry expiry"""
+
+    def __init__(self, max_entries=RESPONSE_CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            if entry[0] < time.time():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return entry[1]
+
+    def set(self, key, value, ttl):
+        with self._lock:
+            self._data[key] = (time.time() + ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+class DiskBackend:
+    """Cache shared by all worker processes through a directory of files"""
+
+    def __init__(self, directory):
+        self.directory = directory
+        self._sets = 0
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key):
+        digest = hashlib.sha1(repr(key).encode('utf-8')).hexdigest()
+        return os.path.join(self.directory, digest + '.cache')
+
+    def get(self, key):
+        try:
+            with open(self._path(key), 'rb') as f:
+                expires, stored_key, value = pickle.load(f)
+        except (OSError, EOFError, pickle.UnpicklingError):
+            return None
+        if expires < time.time() or stored_key != key:
+            return None
+        return value
+
+    def set(self, key, value, ttl):
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                pickle.dump((time.time() + ttl, key, value), f, pickle.HIGHEST_PROTOCOL)
+            # Atomic rename so readers never see a partial file
+            os.replace(tmp_path, self._path(key))
+        except OSError:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            return
+        self._sets += 1
+        if self._sets % 256 == 0:
+            self.prune()
+
+    def prune(self):
+        """Remove expired entries (old content versions expire on their own)"""
+        now = time.time()
+        for name in os.listdir(self.directory):
+            if not name.endswith('.cache'):
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                with open(path, 'rb') as f:
+                    expires = pickle.load(f)[0]
+                if expires < now:
+                    os.remove(path)
+            except (OSError, EOFError, pickle.UnpicklingError):
+                pass
+
+    def clear(self):
+        for name in os.listdir(self.directory):
+            if name.endswith('.cache'):
+                try:
+                    os.remove(os.path.join(self.directory, name))
+                except OSError:
+                    pass
+
+class ResponseCache:
+    """LRU+TTL cache of rendered GET responses.
+
+    Keys combine the endpoint, its view args, a caller-supplied variant
+    (the active language) and the normalized query string with the current
+    content version, so an admin write invalidates every page exactly.
+    """
+
+    def __init__(self):
+        self.enabled = True
+        self.ttl = RESPONSE_CACHE_TTL
+        self.memory = MemoryBackend()
+        self.shared = None
+
+    def init_app(self, app):
+        self.enabled = app.config.setdefault('RESPONSE_CACHE_ENABLED', True)
+        self.ttl = app.config.setdefault('RESPONSE_CACHE_TTL', RESPONSE_CACHE_TTL)
+        self.memory = MemoryBackend(
+            app.config.setdefault('RESPONSE_CACHE_MAX_ENTRIES', RESPONSE_CACHE_MAX_ENTRIES))
+        directory = app.config.setdefault('RESPONSE_CACHE_DIR', None)
+        self.shared = DiskBackend(directory) if directory else None
+
+    def make_key(self, variant):
+        # Drop empty values and order args so equivalent URLs share an entry
+        args = tuple(sorted((k, v) for k, v in request.args.items(multi=True) if v != ''))
+        view_args = tuple(sorted((request.view_args or {}).items()))
+        return (request.endpoint, view_args, variant, args, get_content_version())
+
+    def get(self, key):
+        value = self.memory.get(key)
+        if value is None and self.shared is not None:
+            value = self.shared.get(key)
+            if value is not None:
+                self.memory.set(key, value, self.ttl)
+        return value
+
+    def set(self, key, value):
+        self.memory.set(key, value, self.ttl)
+        if self.shared is not None:
+            self.shared.set(key, value, self.ttl)
+
+    def clear(self):
+        self.memory.clear()
+        if self.shared is not None:
+            self.shared.clear()
+
+    def cached(self, vary=None):
+        """Decorator caching a view's 200 responses, varied by vary()"""
+        def decorator(view):
+            @wraps(view)
+            def wrapper(*args, **kwargs):
+                if not self.enabled or request.method != 'GET':
+                    return view(*args, **kwargs)
+
+                key = self.make_key(vary() if vary else None)
+                # asgi.py hands over the entry it already found, so a hit is
+                # answered from that entry even if it expires meanwhile
+                prefetched = g.pop('response_cache_hit', None)
+                hit = prefetched[1] if prefetched and prefetched[0] == key else self.get(key)
+                if hit is not None:
+                    status, headers, body = hit
+                    response = make_response(body, status, headers)
+                    response.headers['X-Cache'] = 'HIT'
+                    # Cached pages keep their ETag / Last-Modified, so
+                    # revalidations are answered without touching the view
+                    return response.make_conditional(request)
+
+                response = make_response(view(*args, **kwargs))
+                response.vary.add('Cookie')
+                if response.status_code == 200 and not response.direct_passthrough:
+                    headers = [(k, v) for k, v in response.headers.items()
+                               if k.lower() not in _UNCACHEABLE_HEADERS]
+                    self.set(key, (response.status_code, headers, response.get_data()))
+                response.headers['X-Cache'] = 'MISS'
+                return response
+            return wrapper
+        return decorator
+
+response_cache = ResponseCache()
@@ -1,16 +1,43 @@
 import sqlite3
+import sys
 import os
-from datetime import datetime
+import json
+import threading
+import time
+
+from search import FTS_COLUMNS, fold_sql
 
 DATABASE_NAME = 'ilanlar.db'
 
-def init_db():
-    """Initialize the database with the ilanlar table"""
-    conn = sqlite3.connect(DATABASE_NAME)
-    cursor = conn.cursor()
-    
-    # Create ilanlar table
-    cursor.execute('''
+# Connection tuning, applied once when a connection is opened.
+# Overridable through the Flask config (see init_app).
+SQLITE_CACHE_SIZE_KB = 16384          # page cache per connection (16MB)
+SQLITE_MMAP_SIZE = 64 * 1024 * 1024   # memory-mapped I/O window (64MB)
+SQLITE_BUSY_TIMEOUT_MS = 5000
+
+# One long-lived connection per thread (per worker process)
+_local = threading.local()
+
+# Pre-migration location of the daily view bump marker
+LEGACY_VIEW_METADATA_FILE = 'static/view_update_metadata.json'
+
+def _import_legacy_view_marker(conn):
+    """Carry the JSON view-update marker over into app_state"""
+    try:
+        with open(LEGACY_VIEW_METADATA_FILE, 'r') as f:
+            last_update = json.load(f)['last_update']
+    except (OSError, KeyError, ValueError):
+        return
+    conn.execute('''
+        INSERT OR IGNORE INTO app_state (key, value) VALUES ('last_view_update', ?)
+    ''', (last_update,))
+
+# Schema migrations, applied in order and tracked through PRAGMA user_version.
+# Each entry is (version, description, steps); a step is an SQL string or a
+# callable taking the connection. Never edit a shipped migration, append one.
+MIGRATIONS = [
+    (1, 'create ilanlar table', [
+        '''
         CREATE TABLE IF NOT EXISTS ilanlar (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
             title TEXT NOT NULL,
@@ -33,36 +60,260 @@ def init_db():
             creation_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
             update_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP
         )
-    ''')
+        ''',
+    ]),
+    (2, 'indexes for listing, popularity and contract lookups', [
+        # WHERE status = 1 ORDER BY creation_date DESC (rowid is the implicit tiebreaker)
+        'CREATE INDEX IF NOT EXISTS idx_ilanlar_status_creation ON ilanlar (status, creation_date)',
+        # WHERE status = 1 ORDER BY view DESC LIMIT 5
+        'CREATE INDEX IF NOT EXISTS idx_ilanlar_status_view ON ilanlar (status, view)',
+        'CREATE INDEX IF NOT EXISTS idx_ilanlar_contract_id ON ilanlar (contract_id)',
+        'ANALYZE ilanlar',
+    ]),
+    (3, 'app_state table for job markers', [
+        '''
+        CREATE TABLE IF NOT EXISTS app_state (
+            key TEXT PRIMARY KEY,
+            value TEXT
+        )
+        ''',
+        _import_legacy_view_marker,
+    ]),
+    (4, 'image_derivatives table for resized uploads', [
+        '''
+        CREATE TABLE IF NOT EXISTS image_derivatives (
+            source TEXT NOT NULL,
+            variant TEXT NOT NULL,
+            format TEXT NOT NULL,
+            url TEXT NOT NULL,
+            width INTEGER,
+            height INTEGER,
+            PRIMARY KEY (source, variant, format)
+        )
+        ''',
+    ]),
+    (5, 'ilanlar_fts full-text index kept in sync by triggers', [
+        # Stores its own folded copy of the text (see search.fold_turkish)
+        f'''
+        CREATE VIRTUAL TABLE IF NOT EXISTS ilanlar_fts USING fts5(
+            {', '.join(FTS_COLUMNS)},
+            tokenize = 'unicode61 remove_diacritics 2',
+            prefix = '2 3'
+        )
+        ''',
+        f'''
+        CREATE TRIGGER IF NOT EXISTS ilanlar_fts_insert AFTER INSERT ON ilanlar BEGIN
+            INSERT INTO ilanlar_fts (rowid, {', '.join(FTS_COLUMNS)})
+            VALUES (new.id, {', '.join(fold_sql('new.' + c) for c in FTS_COLUMNS)});
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS ilanlar_fts_delete AFTER DELETE ON ilanlar BEGIN
+            DELETE FROM ilanlar_fts WHERE rowid = old.id;
+        END
+        ''',
+        f'''
+        CREATE TRIGGER IF NOT EXISTS ilanlar_fts_update AFTER UPDATE OF {', '.join(FTS_COLUMNS)} ON ilanlar BEGIN
+            DELETE FROM ilanlar_fts WHERE rowid = old.id;
+            INSERT INTO ilanlar_fts (rowid, {', '.join(FTS_COLUMNS)})
+            VALUES (new.id, {', '.join(fold_sql('new.' + c) for c in FTS_COLUMNS)});
+        END
+        ''',
+        f'''
+        INSERT INTO ilanlar_fts (rowid, {', '.join(FTS_COLUMNS)})
+        SELECT id, {', '.join(fold_sql(c) for c in FTS_COLUMNS)} FROM ilanlar
+        ''',
+    ]),
+    (6, 'indexes for faceted filtering on /ilanlar', [
+        'CREATE INDEX IF NOT EXISTS idx_ilanlar_status_type_creation ON ilanlar (status, advertisement_type, creation_date)',
+        'CREATE INDEX IF NOT EXISTS idx_ilanlar_status_bed_creation ON ilanlar (status, bed_type, creation_date)',
+        'CREATE INDEX IF NOT EXISTS idx_ilanlar_status_sale_price ON ilanlar (status, sale_price)',
+        'CREATE INDEX IF NOT EXISTS idx_ilanlar_status_rent_price ON ilanlar (status, rent_price)',
+        'ANALYZE ilanlar',
+    ]),
+    (7, 'uploads table with reference counts for content-addressed images', [
+        '''
+        CREATE TABLE IF NOT EXISTS uploads (
+            path TEXT PRIMARY KEY,
+            refcount INTEGER NOT NULL DEFAULT 0
+        )
+        ''',
+        # Existing uploads start with one reference per listing image slot
+        '''
+        INSERT OR IGNORE INTO uploads (path, refcount)
+        SELECT path, COUNT(*) FROM (
+            SELECT img_1 AS path FROM ilanlar
+            UNION ALL SELECT img_2 FROM ilanlar
+            UNION ALL SELECT img_3 FROM ilanlar
+        )
+        WHERE path LIKE 'user_custom_upload/%'
+        GROUP BY path
+        ''',
+    ]),
+    (8, 'durable queue of uploads waiting to be deleted', [
+        '''
+        CREATE TABLE IF NOT EXISTS upload_deletions (
+            path TEXT PRIMARY KEY,
+            queued_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+        )
+        ''',
+    ]),
+    (9, 'index on update_date for incremental read model syncs', [
+        'CREATE INDEX IF NOT EXISTS idx_ilanlar_update_date ON ilanlar (update_date)',
+    ]),
+]
+
+def get_schema_version(conn):
+    """Return the schema version stored in the database file"""
+    return conn.execute('PRAGMA user_version').fetchone()[0]
+
+def migrate(conn):
+    """Apply every pending migration, each in its own transaction.
+
+    BEGIN IMMEDIATE takes the write lock up front, so when several workers
+    start at once only one of them runs a given migration; the others wait,
+    re-read user_version and skip it.
     """
-    # Insert some sample data if table is empty
-    cursor.execute('SELECT COUNT(*) FROM ilanlar')
-    count = cursor.fetchone()[0]
-    
-    if count == 0:
-        sample_data = [
-            ('Emin Termal', 'Satılık', 'İstanbul, Türkiye', 150, 1, '/devremulk/emin.jpg', '/devremulk/emin2.jpg', '/devremulk/emin3.jpeg', 120000, None, 'EMN001', 'Kendine ait mutfak bölümü bulunan evlerde uydu yayınlı LCD TV, ücretsiz Wi-Fi, klima, balkon, mutfak gereçleri ve elektronik anahtar sistemi yer alıyor.', 'Houses with their own kitchen area feature satellite LCD TV, free Wi-Fi, air conditioning, balcony, kitchen utensils and electronic key system.', 'تتميز المنازل التي تحتوي على منطقة مطبخ خاصة بها بتلفزيون LCD عبر الأقمار الصناعية ومجاني', 'Tapu', '5+1', 1, datetime.now(), datetime.now()),
-            ('Deniz Manzaralı Villa', 'Satılık', 'Antalya, Türkiye', 89, 0, '/static/img/villa1.jpg', '/static/img/villa2.jpg', None, 850000, None, 'VIL002', 'Deniz manzaralı lüks villa', 'Luxury villa with sea view', 'فيلا فاخرة بإطلالة على البحر', 'Tapu', '4+1', 1, datetime.now(), datetime.now()),
-            ('Merkezi Daire', 'Kiralık', 'Ankara, Türkiye', 45, 0, '/static/img/apt1.jpg', None, None, None, 2500, 'APT003', 'Şehir merkezinde modern daire', 'Modern apartment in city center', 'شقة حديثة في وسط المدينة', 'Tapu', '3+1', 1, datetime.now(), datetime.now())
-        ]
-        
-        cursor.executemany('''
-            INSERT INTO ilanlar (title, advertisement_type, adres, view, is_gold, img_1, img_2, img_3, 
-                               sale_price, rent_price, contract_id, description, description_en, 
-                               description_ar, deed, bed_type, status, creation_date, update_date)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        ''', sample_data)
-    
-    conn.commit()
+    applied = []
+    for version, description, steps in MIGRATIONS:
+        if get_schema_version(conn) >= version:
+            continue
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            if get_schema_version(conn) >= version:
+                conn.execute('ROLLBACK')
+                continue
+            for step in steps:
+                if callable(step):
+                    step(conn)
+                else:
+                    conn.execute(step)
+            conn.execute(f'PRAGMA user_version = {int(version)}')
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        applied.append(version)
+        # stderr: CLI commands such as export-listings write their output to stdout
+        print(f"Applied migration {version}: {description}", file=sys.stderr)
+    return applied
+
+def get_state(conn, key, default=None):
+    """Read a value from the app_state table"""
+    row = conn.execute('SELECT value FROM app_state WHERE key = ?', (key,)).fetchone()
+    return row[0] if row else default
+
+def set_state(conn, key, value):
+    """Write a value to the app_state table (caller commits)"""
+    conn.execute('''
+        INSERT INTO app_state (key, value) VALUES (?, ?)
+        ON CONFLICT(key) DO UPDATE SET value = excluded.value
+    ''', (key, value))
+
+def init_db():
+    """Initialize the database and bring its schema up to date"""
+    # Autocommit mode: migrate() manages its own transactions
+    conn = sqlite3.connect(DATABASE_NAME, isolation_level=None,
+                           timeout=SQLITE_BUSY_TIMEOUT_MS / 1000)
+    conn.execute('PRAGMA journal_mode = WAL')
+    migrate(conn)
     conn.close()
+    print(f"Database initialized successfully: {DATABASE_NAME}", file=sys.stderr)
+
+# Callables taking (conn, sql, params, seconds), run after every statement issued
+# through an InstrumentedConnection (see add_query_listener)
+_query_listeners = []
+
+def add_query_listener(listener):
+    """Register a callable to be told about every executed statement"""
+    if listener not in _query_listeners:
+        _query_listeners.append(listener)
+
+class InstrumentedConnection(sqlite3.Connection):
+    """Connection reporting each statement's duration to the query listeners.
+
+    The time covers preparing the statement and stepping to its first row,
+    which includes sorting and aggregation but not fetching later rows.
     """
-    print(f"Database initialized successfully: {DATABASE_NAME}")
 
-def get_db_connection():
-    """Get database connection"""
-    conn = sqlite3.connect(DATABASE_NAME)
+    def execute(self, sql, parameters=()):
+        if not _query_listeners:
+            return super().execute(sql, parameters)
+        started = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            elapsed = time.perf_counter() - started
+            for listener in _query_listeners:
+                listener(self, sql, parameters, elapsed)
+
+    def executemany(self, sql, seq_of_parameters):
+        if not _query_listeners:
+            return super().executemany(sql, seq_of_parameters)
+        started = time.perf_counter()
+        try:
+            return super().executemany(sql, seq_of_parameters)
+        finally:
+            elapsed = time.perf_counter() - started
+            for listener in _query_listeners:
+                listener(self, sql, None, elapsed)
+
+def configure_connection(conn):
+    """Apply WAL journaling and cache/mmap pragmas to a fresh connection"""
     conn.row_factory = sqlite3.Row
+    conn.execute('PRAGMA journal_mode = WAL')
+    conn.execute('PRAGMA synchronous = NORMAL')
+    conn.execute('PRAGMA temp_store = MEMORY')
+    conn.execute(f'PRAGMA cache_size = -{int(SQLITE_CACHE_SIZE_KB)}')
+    conn.execute(f'PRAGMA mmap_size = {int(SQLITE_MMAP_SIZE)}')
+    conn.execute(f'PRAGMA busy_timeout = {int(SQLITE_BUSY_TIMEOUT_MS)}')
     return conn
 
+def get_db_connection():
+    """Get a new, tuned database connection (caller must close it)"""
+    conn = sqlite3.connect(DATABASE_NAME, factory=InstrumentedConnection)
+    return configure_connection(conn)
+
+def pooled_connection():
+    """Return this thread's pooled connection, opening it on first use"""
+    conn = getattr(_local, 'conn', None)
+    # Connections must not cross a fork (e.g. gunicorn --preload)
+    if conn is not None and getattr(_local, 'pid', None) != os.getpid():
+        conn = None
+    if conn is None:
+        conn = get_db_connection()
+        _local.conn = conn
+        _local.pid = os.getpid()
+    return conn
+
+def get_db():
+    """Get the pooled connection bound to the current Flask app context"""
+    from flask import g
+    if 'db' not in g:
+        g.db = pooled_connection()
+    return g.db
+
+def release_db(exception=None):
+    """Return the app context's connection to the pool at teardown"""
+    from flask import g
+    conn = g.pop('db', None)
+    if conn is not None and conn.in_transaction:
+        # Never leak an unfinished transaction into the next request
+        conn.rollback()
+
+def close_pool():
+    """Close this thread's pooled connection"""
+    conn = getattr(_local, 'conn', None)
+    if conn is not None:
+        conn.close()
+        _local.conn = None
+
+def init_app(app):
+    """Read connection tuning from app.config and register the teardown hook"""
+    global SQLITE_CACHE_SIZE_KB, SQLITE_MMAP_SIZE
+    SQLITE_CACHE_SIZE_KB = app.config.setdefault('SQLITE_CACHE_SIZE_KB', SQLITE_CACHE_SIZE_KB)
+    SQLITE_MMAP_SIZE = app.config.setdefault('SQLITE_MMAP_SIZE', SQLITE_MMAP_SIZE)
+    app.teardown_appcontext(release_db)
+
 if __name__ == '__main__':
     init_db()
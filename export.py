@@ -0,0 +1,100 @@
+import csv
+import io
+import json
+import sys
+
+import click
+
+from database import get_db_connection
+
+# Every column of ilanlar, in export order
+EXPORT_COLUMNS = (
+    'id', 'title', 'advertisement_type', 'adres', 'view', 'is_gold',
+    'img_1', 'img_2', 'img_3', 'sale_price', 'rent_price', 'contract_id',
+    'description', 'description_en', 'description_ar', 'deed', 'bed_type',
+    'status', 'creation_date', 'update_date'
+)
+EXPORT_FORMATS = ('csv', 'ndjson')
+EXPORT_BATCH_SIZE = 500
+
+def build_export_query(status=None, ad_type=None, date_from=None, date_to=None):
+    """Build the SELECT and its parameters for the given filters"""
+    conditions = []
+    params = []
+    if status is not None:
+        conditions.append('status = ?')
+        params.append(int(status))
+    if ad_type:
+        conditions.append('advertisement_type = ?')
+        params.append(ad_type)
+    if date_from:
+        conditions.append('creation_date >= ?')
+        params.append(date_from)
+    if date_to:
+        # Inclusive end date
+        conditions.append("creation_date < date(?, '+1 day')")
+        params.append(date_to)
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+    return f"SELECT {', '.join(EXPORT_COLUMNS)} FROM ilanlar {where} ORDER BY id", params
+
+def iter_listings(**filters):
+    """Yield matching rows as tuples, fetching them from SQLite in batches"""
+    query, params = build_export_query(**filters)
+    conn = get_db_connection()
+    try:
+        cursor = conn.execute(query, params)
+        while True:
+            rows = cursor.fetchmany(EXPORT_BATCH_SIZE)
+            if not rows:
+                break
+            for row in rows:
+                yield tuple(row)
+    finally:
+        conn.close()
+
+def iter_csv(rows):
+    """Encode rows as CSV, one chunk per row"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(EXPORT_COLUMNS)
+    for row in rows:
+        writer.writerow(row)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    # Header only, when nothing matched
+    if buffer.tell():
+        yield buffer.getvalue()
+
+def iter_ndjson(rows):
+    """Encode rows as newline-delimited JSON objects"""
+    for row in rows:
+        yield json.dumps(dict(zip(EXPORT_COLUMNS, row)), ensure_ascii=False) + '\n'
+
+def iter_export(fmt, **filters):
+    """Stream the filtered listings in the requested format"""
+    rows = iter_listings(**filters)
+    if fmt == 'csv':
+        return iter_csv(rows)
+    return iter_ndjson(rows)
+
+@click.command('export-listings')
+@click.option('--format', 'fmt', type=click.Choice(EXPORT_FORMATS), default='csv')
+@click.option('--status', type=click.IntRange(0, 1), default=None, help='1 for active, 0 for inactive')
+@click.option('--type', 'ad_type', default=None, help='advertisement_type, e.g. Satılık')
+@click.option('--from', 'date_from', default=None, help='creation date lower bound (YYYY-MM-DD)')
+@click.option('--to', 'date_to', default=None, help='creation date upper bound, inclusive (YYYY-MM-DD)')
+@click.option('--output', '-o', type=click.Path(dir_okay=False, writable=True), default=None)
+def export_listings_command(fmt, status, ad_type, date_from, date_to, output):
+    """Stream the ilanlar table to a file or stdout."""
+    chunks = iter_export(fmt, status=status, ad_type=ad_type,
+                         date_from=date_from, date_to=date_to)
+    if output:
+        with open(output, 'w', encoding='utf-8', newline='') as f:
+            f.writelines(chunks)
+    else:
+        sys.stdout.writelines(chunks)
+
+def init_app(app):
+    """Register the export CLI command"""
+    app.cli.add_command(export_listings_command)
@@ -0,0 +1,162 @@
+from flask import url_for
+
+from cache import get_content_version
+
+# price_type -> the price column it filters and displays
+PRICE_COLUMNS = {
+    'satilik': 'sale_price',
+    'kiralik': 'rent_price',
+}
+
+# Facet buckets per price_type as (min, max) in TL; max None means open-ended
+PRICE_BUCKETS = {
+    'satilik': [(0, 1000000), (1000000, 3000000), (3000000, 5000000),
+                (5000000, 10000000), (10000000, None)],
+    'kiralik': [(0, 10000), (10000, 25000), (25000, 50000), (50000, None)],
+}
+
+# Query args that narrow /ilanlar, in the order they appear in links
+FILTER_ARGS = ('price_type', 'type', 'bed_type', 'min_price', 'max_price')
+
+# Facet counts per (content version, price_type)
+_facet_cache = {}
+
+def parse_price(price_str):
+    """Parse formatted price string (e.g., '5.950.000') to float"""
+    if not price_str:
+        return None
+    # Remove dots and convert to float
+    clean_price = price_str.replace('.', '')
+    try:
+        return float(clean_price)
+    except ValueError:
+        return None
+
+def parse_listing_filters(args):
+    """Read the /ilanlar filter arguments, dropping empty or invalid ones"""
+    filters = {}
+    price_type = args.get('price_type', '', type=str)
+    if price_type in PRICE_COLUMNS:
+        filters['price_type'] = price_type
+    for name in ('type', 'bed_type'):
+        value = args.get(name, '', type=str).strip()
+        if value:
+            filters[name] = value
+    for name in ('min_price', 'max_price'):
+        value = args.get(name, None, type=float)
+        if value is not None and value >= 0:
+            filters[name] = value
+    return filters
+
+def filter_conditions(filters, prefix=''):
+    """SQL conditions and parameters for parsed filters"""
+    conditions = []
+    params = []
+    price_column = prefix + PRICE_COLUMNS[filters.get('price_type', 'satilik')]
+    if filters.keys() & {'price_type', 'min_price', 'max_price'}:
+        # Only listings that actually have a price of this kind
+        conditions.append(f'{price_column} > 0')
+    if 'type' in filters:
+        conditions.append(f'{prefix}advertisement_type = ?')
+        params.append(filters['type'])
+    if 'bed_type' in filters:
+        conditions.append(f'{prefix}bed_type = ?')
+        params.append(filters['bed_type'])
+    if 'min_price' in filters:
+        conditions.append(f'{price_column} >= ?')
+        params.append(filters['min_price'])
+    if 'max_price' in filters:
+        conditions.append(f'{price_column} < ?')
+        params.append(filters['max_price'])
+    return conditions, params
+
+def matches(listing, filters):
+    """Whether a listing passes the parsed filters (filter_conditions in Python)"""
+    price = listing[PRICE_COLUMNS[filters.get('price_type', 'satilik')]]
+    if filters.keys() & {'price_type', 'min_price', 'max_price'} and not (price and price > 0):
+        return False
+    if 'type' in filters and listing['advertisement_type'] != filters['type']:
+        return False
+    if 'bed_type' in filters and listing['bed_type'] != filters['bed_type']:
+        return False
+    if 'min_price' in filters and price < filters['min_price']:
+        return False
+    if 'max_price' in filters and price >= filters['max_price']:
+        return False
+    return True
+
+def _bucket_case(price_column, buckets):
+    """CASE expression mapping a price to its bucket index"""
+    whens = []
+    for index, (low, high) in enumerate(buckets):
+        if high is None:
+            whens.append(f'WHEN {price_column} >= {low} THEN {index}')
+        else:
+            whens.append(f'WHEN {price_column} >= {low} AND {price_column} < {high} THEN {index}')
+    return f"CASE {' '.join(whens)} END"
+
+def get_facets(conn, price_type):
+    """Counts of active listings per type, room type and price bucket.
+
+    All three facets come from one grouped statement over the same row
+    set and are cached until the next admin write changes the content
+    version.
+    """
+    price_type = price_type if price_type in PRICE_COLUMNS else 'satilik'
+    key = (get_content_version(), price_type)
+    facets = _facet_cache.get(key)
+    if facets is not None:
+        return facets
+
+    price_column = PRICE_COLUMNS[price_type]
+    buckets = PRICE_BUCKETS[price_type]
+    rows = conn.execute(f'''
+        WITH active AS (
+            SELECT advertisement_type, bed_type, {price_column} AS price
+            FROM ilanlar
+            WHERE status = 1
+        )
+        SELECT 'type' AS facet, advertisement_type AS value, COUNT(*) AS total
+        FROM active WHERE advertisement_type IS NOT NULL AND advertisement_type != ''
+        GROUP BY advertisement_type
+        UNION ALL
+        SELECT 'bed_type', bed_type, COUNT(*)
+        FROM active WHERE bed_type IS NOT NULL AND bed_type != ''
+        GROUP BY bed_type
+        UNION ALL
+        SELECT 'price', {_bucket_case('price', buckets)} AS bucket, COUNT(*)
+        FROM active WHERE price > 0
+        GROUP BY bucket
+    ''').fetchall()
+
+    facets = {'type': [], 'bed_type': [], 'price': []}
+    for row in rows:
+        if row['facet'] == 'price':
+            if row['value'] is None:
+                continue
+            low, high = buckets[row['value']]
+            facets['price'].append({'min_price': low, 'max_price': high, 'total': row['total']})
+        else:
+            facets[row['facet']].append({'value': row['value'], 'total': row['total']})
+    for name in ('type', 'bed_type'):
+        facets[name].sort(key=lambda item: (-item['total'], item['value']))
+    facets['price'].sort(key=lambda item: item['min_price'])
+
+    if len(_facet_cache) > 16:
+        _facet_cache.clear()
+    _facet_cache[key] = facets
+    return facets
+
+def filter_url(filter_args, **changes):
+    """URL of /ilanlar with some filters changed; a None value drops the filter"""
+    args = dict(filter_args)
+    for name, value in changes.items():
+        if value is None:
+            args.pop(name, None)
+        else:
+            args[name] = value
+    return url_for('ilanlar', **args)
+
+def init_app(app):
+    """Expose filter_url() to templates"""
+    app.add_template_global(filter_url)
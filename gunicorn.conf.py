@@ -0,0 +1,70 @@
+import gc
+import multiprocessing
+import os
+import subprocess
+import sys
+
+# Production launcher: `gunicorn` (this file is picked up from the working
+# directory). The master prepares the app once -- migrations, upload folder,
+# compiled templates, asset manifest -- and then forks the workers.
+#
+#   WEB_CONCURRENCY   worker processes (default: one per core)
+#   WEB_THREADS       threads per worker (default 4)
+#   PRELOAD           1 (default): import the app in the master, workers
+#                     share its memory; 0: every worker imports the code
+#   APP_MODULE        wsgi:app, or asgi:application with
+#                     WORKER_CLASS=uvicorn.workers.UvicornWorker
+#
+# Graceful reload: `kill -HUP <master>` starts new workers and lets the old
+# ones finish their requests. With PRELOAD=0 the new workers load new code
+# (prepared again by on_reload); with PRELOAD=1 the code stays the master's,
+# so deploy with `kill -USR2` (new master) and then `kill -TERM` the old one.
+
+# Workers must not migrate on import; the master does it below
+os.environ.setdefault('PREPARE_ON_IMPORT', '0')
+
+wsgi_app = os.environ.get('APP_MODULE', 'wsgi:app')
+bind = os.environ.get('BIND', '0.0.0.0:8025')
+workers = int(os.environ.get('WEB_CONCURRENCY', multiprocessing.cpu_count()))
+threads = int(os.environ.get('WEB_THREADS', 4))
+worker_class = os.environ.get('WORKER_CLASS', 'gthread')
+preload_app = os.environ.get('PRELOAD', '1') == '1'
+
+timeout = int(os.environ.get('WORKER_TIMEOUT', 30))
+graceful_timeout = int(os.environ.get('GRACEFUL_TIMEOUT', 30))
+keepalive = 5
+# Recycle workers now and then; the jitter keeps them from restarting together
+max_requests = int(os.environ.get('MAX_REQUESTS', 10000))
+max_requests_jitter = max_requests // 10
+
+def _prepare_in_subprocess():
+    """Prepare without importing the app into the master (PRELOAD=0)"""
+    subprocess.run([sys.executable, '-m', 'flask', '--app', 'app', 'prepare'], check=True)
+
+def on_starting(server):
+    """Prepare the app once, before any socket is bound or worker forked"""
+    if not preload_app:
+        _prepare_in_subprocess()
+        return
+    # Already imported by the preload
+    from app import app
+    import startup
+    if startup.prepare(app):
+        sys.exit('Template compilation failed; not starting workers')
+    # Everything loaded so far lives for the whole process; keeping it out of
+    # the garbage collector stops workers from copying those pages on write
+    gc.freeze()
+
+def on_reload(server):
+    """Migrate and compile for the new code before new workers start"""
+    if not preload_app:
+        _prepare_in_subprocess()
+
+def worker_exit(server, worker):
+    """Write buffered views and stop background threads of an exiting worker"""
+    import sweeper
+    import tasks
+    import view_counter
+    tasks.stop_scheduler()
+    sweeper.stop_sweeper()
+    view_counter.stop_flusher()
@@ -0,0 +1,179 @@
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import click
+from flask import g
+
+from database import get_db, get_db_connection
+
+# Pillow is optional: without it uploads are stored as-is and pages fall
+# back to the original image.
+try:
+    from PIL import Image, ImageOps
+except ImportError:
+    Image = None
+
+# Derivative name -> maximum width in pixels
+IMAGE_VARIANTS = (
+    ('thumb', 320),
+    ('card', 720),
+    ('full', 1600),
+)
+IMAGE_FORMATS = {
+    'webp': ('WEBP', {'quality': 80, 'method': 4}),
+    'jpeg': ('JPEG', {'quality': 82, 'optimize': True, 'progressive': True}),
+}
+
+UPLOAD_FOLDER = 'user_custom_upload'
+STATIC_FOLDER = 'static'
+
+# Resizing is CPU-bound; keep it off the request threads
+_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix='image-derivatives')
+
+def url_to_path(url):
+    """Map an image URL as stored in ilanlar to its file on disk"""
+    if not url or '://' in url:
+        return None
+    relative = url.lstrip('/')
+    if relative.startswith(UPLOAD_FOLDER + '/'):
+        return os.path.join(UPLOAD_FOLDER, relative[len(UPLOAD_FOLDER) + 1:])
+    # Everything else is served from the static folder (static_url_path='')
+    return os.path.join(STATIC_FOLDER, relative)
+
+def derivative_url(url, variant, fmt):
+    """URL of a derivative, stored next to its original"""
+    # Keep the original extension so a.jpg and a.png never share derivatives
+    return f"{url}.{variant}.{'jpg' if fmt == 'jpeg' else fmt}"
+
+def generate_derivatives(url):
+    """Write every variant of an image and record their dimensions"""
+    if Image is None:
+        return []
+    path = url_to_path(url)
+    if not path or not os.path.exists(path):
+        return []
+
+    records = []
+    with Image.open(path) as original:
+        original = ImageOps.exif_transpose(original)
+        if original.mode not in ('RGB', 'L'):
+            original = original.convert('RGB')
+        for variant, max_width in IMAGE_VARIANTS:
+            image = original
+            if original.width > max_width:
+                height = round(original.height * max_width / original.width)
+                image = original.resize((max_width, height), Image.LANCZOS)
+            for fmt, (pil_format, options) in IMAGE_FORMATS.items():
+                target_url = derivative_url(url, variant, fmt)
+                image.save(url_to_path(target_url), pil_format, **options)
+                records.append((url, variant, fmt, target_url, image.width, image.height))
+            if original.width <= max_width:
+                # Larger variants would only be copies of this one
+                break
+
+    conn = get_db_connection()
+    try:
+        conn.execute('DELETE FROM image_derivatives WHERE source = ?', (url,))
+        conn.executemany('''
+            INSERT INTO image_derivatives (source, variant, format, url, width, height)
+            VALUES (?, ?, ?, ?, ?, ?)
+        ''', records)
+        conn.commit()
+    finally:
+        conn.close()
+    return records
+
+def _generate_logged(url):
+    try:
+        generate_derivatives(url)
+    except Exception as e:
+        # Runs in the executor, whose future nobody reads; includes Pillow's
+        # DecompressionBombError and ValueError for unusable images
+        print(f"Error generating derivatives for {url}: {e!r}")
+
+def schedule_derivatives(url):
+    """Queue derivative generation for a freshly saved upload"""
+    if url and Image is not None:
+        _executor.submit(_generate_logged, url)
+
+def remove_derivatives(url, conn=None):
+    """Delete an image's derivative files and records"""
+    own_conn = conn is None
+    if own_conn:
+        conn = get_db_connection()
+    try:
+        rows = conn.execute('SELECT url FROM image_derivatives WHERE source = ?', (url,)).fetchall()
+        for row in rows:
+            try:
+                os.remove(url_to_path(row['url']))
+            except OSError:
+                pass
+        conn.execute('DELETE FROM image_derivatives WHERE source = ?', (url,))
+        if own_conn:
+            conn.commit()
+    finally:
+        if own_conn:
+            conn.close()
+
+def load_srcsets(urls):
+    """Read the srcsets of every image a page shows in one query (see image_srcset)"""
+    cache = g.setdefault('image_srcsets', {})
+    todo = list({url for url in urls if url and url not in cache})
+    if not todo:
+        return
+    srcsets = {url: {} for url in todo}
+    for row in get_db().execute('''
+        SELECT source, format, url, width FROM image_derivatives
+        WHERE source IN (SELECT value FROM json_each(?))
+        ORDER BY source, width
+    ''', (json.dumps(todo),)):
+        srcsets[row['source']].setdefault(row['format'], []).append(f"{row['url']} {row['width']}w")
+    for url, formats in srcsets.items():
+        cache[url] = {fmt: ', '.join(candidates) for fmt, candidates in formats.items()}
+
+def image_srcset(url, fmt='jpeg'):
+    """Return the srcset attribute value for an image, or '' if it has no derivatives.
+
+    Views call load_srcsets() with the page's images first; anything else
+    is looked up on its own.
+    """
+    if not url:
+        return ''
+    cache = g.get('image_srcsets')
+    if cache is None or url not in cache:
+        load_srcsets([url])
+        cache = g.image_srcsets
+    return cache[url].get(fmt, '')
+
+@click.command('backfill-images')
+@click.option('--force', is_flag=True, help='Regenerate images that already have derivatives')
+def backfill_images_command(force):
+    """Generate derivatives for every image referenced by a listing."""
+    if Image is None:
+        raise click.ClickException('Pillow is required: pip install Pillow')
+    conn = get_db_connection()
+    urls = [row[0] for row in conn.execute('''
+        SELECT img_1 FROM ilanlar WHERE img_1 IS NOT NULL AND img_1 != ''
+        UNION SELECT img_2 FROM ilanlar WHERE img_2 IS NOT NULL AND img_2 != ''
+        UNION SELECT img_3 FROM ilanlar WHERE img_3 IS NOT NULL AND img_3 != ''
+    ''')]
+    done = set() if force else {row[0] for row in conn.execute(
+        'SELECT DISTINCT source FROM image_derivatives')}
+    conn.close()
+
+    todo = [url for url in urls if url not in done]
+    with click.progressbar(todo, label=f'Generating derivatives for {len(todo)} images') as bar:
+        for url in bar:
+            try:
+                generate_derivatives(url)
+            except OSError as e:
+                click.echo(f"\nSkipping {url}: {e}")
+
+def init_app(app):
+    """Bind folders to the app config and register the backfill command"""
+    global UPLOAD_FOLDER, STATIC_FOLDER
+    UPLOAD_FOLDER = app.config.get('UPLOAD_FOLDER', UPLOAD_FOLDER)
+    STATIC_FOLDER = app.static_folder or STATIC_FOLDER
+    app.add_template_filter(image_srcset, 'srcset')
+    app.cli.add_command(backfill_images_command)
@@ -0,0 +1,297 @@
+import csv
+import json
+import os
+import re
+import sqlite3
+import time
+from datetime import datetime
+
+import click
+
+from database import get_db_connection
+from cache import bump_content_version
+from filters import parse_price
+from search import fts_backfill_sql
+import uploads
+import sweeper
+
+# Columns an import file may set; others (id, view, update_date) are ignored,
+# so a file written by `flask export-listings` can be imported back
+IMPORT_COLUMNS = (
+    'title', 'advertisement_type', 'adres', 'is_gold', 'img_1', 'img_2', 'img_3',
+    'sale_price', 'rent_price', 'contract_id', 'description', 'description_en',
+    'description_ar', 'deed', 'bed_type', 'status', 'creation_date'
+)
+IMAGE_COLUMNS = ('img_1', 'img_2', 'img_3')
+IMPORT_FORMATS = ('csv', 'json', 'ndjson')
+IMPORT_CHUNK_SIZE = 5000
+
+ALLOWED_IMAGE_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif', 'webp'}
+_TRUE_VALUES = {'1', 'true', 'yes', 'evet', 'x'}
+_CURRENCY = re.compile(r'\s*(TL|₺|TRY)\s*', re.I)
+
+def read_rows(path, fmt=None):
+    """Yield (line number, row) pairs from a CSV, JSON array or NDJSON file.
+
+    A malformed NDJSON line is yielded as its JSONDecodeError, for
+    validate_row to report, so one bad line does not end the file.
+    """
+    fmt = fmt or {'jsonl': 'ndjson'}.get(path.rsplit('.', 1)[-1].lower(), path.rsplit('.', 1)[-1].lower())
+    if fmt == 'csv':
+        with open(path, newline='', encoding='utf-8-sig') as f:
+            # Line 1 is the header
+            for number, row in enumerate(csv.DictReader(f), 2):
+                yield number, row
+    elif fmt == 'ndjson':
+        with open(path, encoding='utf-8') as f:
+            for number, line in enumerate(f, 1):
+                if line.strip():
+                    try:
+                        yield number, json.loads(line)
+                    except json.JSONDecodeError as e:
+                        yield number, e
+    elif fmt == 'json':
+        with open(path, encoding='utf-8') as f:
+            for number, row in enumerate(json.load(f), 1):
+                yield number, row
+    else:
+        raise ValueError(f'Unsupported import format: {fmt}')
+
+def _text(value):
+    if value is None:
+        return None
+    value = str(value).strip()
+    return value or None
+
+def _price(value, errors, column):
+    if value is None or value == '':
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    price = parse_price(_CURRENCY.sub('', str(value)).strip())
+    if price is None:
+        errors.append(f'{column}: invalid price {value!r}')
+    return price
+
+def _flag(value, default):
+    if value is None or value == '':
+        return default
+    return 1 if str(value).strip().lower() in _TRUE_VALUES else 0
+
+def validate_row(raw, images_dir):
+    """Clean one input row; returns (record dict, list of error messages)"""
+    if isinstance(raw, json.JSONDecodeError):
+        return None, [f'invalid JSON: {raw.msg} (column {raw.colno})']
+    if not isinstance(raw, dict):
+        return None, [f'expected an object, got {type(raw).__name__}']
+    errors = []
+    record = {column: _text(raw.get(column)) for column in IMPORT_COLUMNS}
+    if not record['title']:
+        errors.append('title is required')
+    if not record['contract_id']:
+        errors.append('contract_id is required')
+    record['sale_price'] = _price(raw.get('sale_price'), errors, 'sale_price')
+    record['rent_price'] = _price(raw.get('rent_price'), errors, 'rent_price')
+    record['is_gold'] = _flag(raw.get('is_gold'), 0)
+    record['status'] = _flag(raw.get('status'), 1)
+    if record['creation_date']:
+        try:
+            record['creation_date'] = datetime.fromisoformat(
+                record['creation_date'].replace('T', ' ')).strftime('%Y-%m-%d %H:%M:%S')
+        except ValueError:
+            errors.append(f"creation_date: invalid date {record['creation_date']!r}")
+
+    for column in IMAGE_COLUMNS:
+        value = record[column]
+        if not value or value.startswith(('/', 'http://', 'https://')) or uploads.is_managed(value):
+            # Site images, remote URLs and stored uploads (as in an export)
+            # are referenced as they are; import_chunk counts the latter
+            continue
+        source = os.path.join(images_dir, value)
+        extension = value.rsplit('.', 1)[-1].lower()
+        if extension not in ALLOWED_IMAGE_EXTENSIONS:
+            errors.append(f'{column}: unsupported image type {value!r}')
+        elif not os.path.isfile(source):
+            errors.append(f'{column}: image not found {source!r}')
+        else:
+            # Marked for copying into the upload store at insert time
+            record[column] = ('copy', source)
+    return record, errors
+
+class Importer:
+    """Upserts validated records by contract_id in chunked transactions"""
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.inserted = 0
+        self.updated = 0
+        self.images_copied = 0
+        # Source file -> stored path, so a photo reused across rows is hashed once
+        self._stored = {}
+
+    def _store_image(self, value):
+        """Copy a ('copy', source) image into the upload store, taking a reference"""
+        source = value[1]
+        path = self._stored.get(source)
+        if path is None:
+            path, created = uploads.store_local_file(self.conn, source)
+            self._stored[source] = path
+            self.images_copied += created
+        else:
+            uploads.add_reference(self.conn, path)
+        return path
+
+    def import_chunk(self, records):
+        """Write one chunk in a single transaction; returns paths released by it"""
+        conn = self.conn
+        # Later rows win when a file repeats a contract_id
+        by_contract = {record['contract_id']: record for record in records}
+        released = []
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            existing = {row['contract_id']: row for row in conn.execute('''
+                SELECT id, contract_id, img_1, img_2, img_3 FROM ilanlar
+                WHERE contract_id IN (SELECT value FROM json_each(?))
+            ''', (json.dumps(list(by_contract)),))}
+
+            # Per-row FTS maintenance costs more than the insert itself; drop
+            # the triggers inside this transaction and index the chunk in one
+            # statement before putting them back. Other connections never
+            # see the schema without them.
+            triggers = [row[0] for row in conn.execute('''
+                SELECT sql FROM sqlite_master
+                WHERE type = 'trigger' AND name IN ('ilanlar_fts_insert', 'ilanlar_fts_update')
+            ''')]
+            conn.execute('DROP TRIGGER IF EXISTS ilanlar_fts_insert')
+            conn.execute('DROP TRIGGER IF EXISTS ilanlar_fts_update')
+            max_id = conn.execute('SELECT COALESCE(MAX(id), 0) FROM ilanlar').fetchone()[0]
+
+            inserts, updates, updated_ids = [], [], []
+            for contract_id, record in by_contract.items():
+                current = existing.get(contract_id)
+                dropped = []
+                for column in IMAGE_COLUMNS:
+                    value = record[column]
+                    old = current[column] if current is not None else None
+                    if isinstance(value, tuple):
+                        # Copying takes a reference, even to the same content
+                        value = self._store_image(value)
+                        dropped.append(old)
+                    elif value != old:
+                        if uploads.is_managed(value):
+                            uploads.add_reference(conn, value)
+                        dropped.append(old)
+                    record[column] = value
+                values = [record[column] for column in IMPORT_COLUMNS]
+                if current is None:
+                    inserts.append(values)
+                    continue
+                # Released after the new references are taken, so images
+                # moved between columns never drop to zero
+                for path in dropped:
+                    if uploads.release_upload(conn, path):
+                        released.append(path)
+                updates.append(values + [current['id']])
+                updated_ids.append(current['id'])
+
+            conn.executemany(f'''
+                INSERT INTO ilanlar ({', '.join(IMPORT_COLUMNS)}, update_date)
+                VALUES ({', '.join('?' for _ in IMPORT_COLUMNS[:-1])},
+                        COALESCE(?, CURRENT_TIMESTAMP), CURRENT_TIMESTAMP)
+            ''', inserts)
+            conn.executemany(f'''
+                UPDATE ilanlar SET {', '.join(f'{column} = ?' for column in IMPORT_COLUMNS[:-1])},
+                    creation_date = COALESCE(?, creation_date), update_date = CURRENT_TIMESTAMP
+                WHERE id = ?
+            ''', updates)
+
+            ids = json.dumps(updated_ids)
+            conn.execute('DELETE FROM ilanlar_fts WHERE rowid IN (SELECT value FROM json_each(?))', (ids,))
+            conn.execute(fts_backfill_sql('id > ?'), (max_id,))
+            if updated_ids:
+                conn.execute(fts_backfill_sql('id IN (SELECT value FROM json_each(?))'), (ids,))
+            for sql in triggers:
+                conn.execute(sql)
+
+            bump_content_version(conn)
+            conn.execute('COMMIT')
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+        self.inserted += len(inserts)
+        self.updated += len(updates)
+        return released
+
+@click.command('import-listings')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--format', 'fmt', type=click.Choice(IMPORT_FORMATS), default=None,
+              help='Input format (default: from the file extension)')
+@click.option('--images-dir', type=click.Path(file_okay=False), default=None,
+              help='Directory relative image paths are read from (default: the file\'s directory)')
+@click.option('--chunk-size', default=IMPORT_CHUNK_SIZE, show_default=True, help='Rows per transaction')
+@click.option('--strict', is_flag=True, help='Validate the whole file first and import nothing if a row is invalid')
+@click.option('--dry-run', is_flag=True, help='Only validate the file')
+def import_listings_command(path, fmt, images_dir, chunk_size, strict, dry_run):
+    """Import listings from CSV, JSON or NDJSON, upserting by contract_id."""
+    images_dir = images_dir or os.path.dirname(os.path.abspath(path))
+
+    def validated():
+        for number, raw in read_rows(path, fmt):
+            record, errors = validate_row(raw, images_dir)
+            yield number, record, errors
+
+    invalid = 0
+    if strict or dry_run:
+        try:
+            for number, record, errors in validated():
+                if errors:
+                    invalid += 1
+                    click.echo(f"line {number}: {'; '.join(errors)}", err=True)
+        except (OSError, ValueError) as e:
+            # The file as a whole is unreadable (e.g. a broken JSON array)
+            raise click.ClickException(f'Cannot read {path}: {e}')
+        if dry_run or invalid:
+            click.echo(f'{invalid} invalid rows' + ('' if dry_run else '; nothing imported'))
+            if invalid:
+                raise SystemExit(1)
+            return
+        invalid = 0
+
+    conn = get_db_connection()
+    conn.isolation_level = None  # import_chunk manages its transactions
+    importer = Importer(conn)
+    started = time.perf_counter()
+    chunk = []
+
+    def flush():
+        importer.import_chunk(chunk)
+        chunk.clear()
+        done = importer.inserted + importer.updated
+        click.echo(f'\r{done} rows ({done / (time.perf_counter() - started):.0f} rows/s)', nl=False, err=True)
+
+    try:
+        for number, record, errors in validated():
+            if errors:
+                invalid += 1
+                click.echo(f"\nline {number}: skipped: {'; '.join(errors)}", err=True)
+                continue
+            chunk.append(record)
+            if len(chunk) >= chunk_size:
+                flush()
+        if chunk:
+            flush()
+        # Images replaced by updated rows were queued for deletion
+        removed, _ = sweeper.sweep_pending(conn)
+    except (OSError, ValueError, sqlite3.Error) as e:
+        raise click.ClickException(f'Import stopped: {e}')
+    finally:
+        conn.close()
+
+    click.echo(f'\nInserted {importer.inserted}, updated {importer.updated}, skipped {invalid}, '
+               f'copied {importer.images_copied} images, removed {removed} in {time.perf_counter() - started:.1f}s')
+    if importer.images_copied:
+        click.echo('Run `flask backfill-images` to build their resized variants.')
+
+def init_app(app):
+    """Register the import command"""
+    app.cli.add_command(import_listings_command)
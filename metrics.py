@@ -0,0 +1,140 @@
+import threading
+import time
+
+from flask import before_render_template, g, has_request_context, request, template_rendered
+
+from database import add_query_listener
+
+# Latency buckets in seconds, shared by the histograms below
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+PROMETHEUS_CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+_lock = threading.Lock()
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+class Counter:
+    """Monotonic counter with labels"""
+
+    def __init__(self, name, description, label_names):
+        self.name = name
+        self.description = description
+        self.label_names = label_names
+        self.values = {}
+
+    def inc(self, labels, amount=1):
+        with _lock:
+            self.values[labels] = self.values.get(labels, 0) + amount
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.description}', f'# TYPE {self.name} counter']
+        with _lock:
+            for labels, value in sorted(self.values.items()):
+                lines.append(f'{self.name}{_labels(self.label_names, labels)} {value:g}')
+        return lines
+
+class Histogram:
+    """Cumulative-bucket histogram with labels"""
+
+    def __init__(self, name, description, label_names, buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.description = description
+        self.label_names = label_names
+        self.buckets = buckets
+        self.series = {}  # labels -> [bucket counts..., sum, count]
+
+    def observe(self, labels, value):
+        with _lock:
+            series = self.series.get(labels)
+            if series is None:
+                series = self.series[labels] = [0] * (len(self.buckets) + 2)
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[index] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.description}', f'# TYPE {self.name} histogram']
+        with _lock:
+            for labels, series in sorted(self.series.items()):
+                for bound, count in zip(self.buckets, series):
+                    lines.append(f'{self.name}_bucket{_labels(self.label_names, labels, [("le", f"{bound:g}")])} {count}')
+                lines.append(f'{self.name}_bucket{_labels(self.label_names, labels, [("le", "+Inf")])} {series[-1]}')
+                lines.append(f'{self.name}_sum{_labels(self.label_names, labels)} {series[-2]:.6f}')
+                lines.append(f'{self.name}_count{_labels(self.label_names, labels)} {series[-1]}')
+        return lines
+
+REQUEST_DURATION = Histogram('http_request_duration_seconds', 'Time spent handling a request.',
+                             ('endpoint', 'method', 'status'))
+SQL_QUERIES = Counter('sqlite_queries_total', 'SQL statements executed while handling requests.',
+                      ('endpoint',))
+SQL_SECONDS = Counter('sqlite_query_seconds_total', 'Time spent in SQL statements while handling requests.',
+                      ('endpoint',))
+TEMPLATE_DURATION = Histogram('template_render_duration_seconds', 'Time spent rendering a template.',
+                              ('template',))
+METRICS = (REQUEST_DURATION, SQL_QUERIES, SQL_SECONDS, TEMPLATE_DURATION)
+
+def render_prometheus():
+    """All metrics of this process in the Prometheus text exposition format"""
+    lines = []
+    for metric in METRICS:
+        lines.extend(metric.render())
+    return '\n'.join(lines) + '\n'
+
+def _record_query(conn, sql, params, seconds):
+    # Background threads (scheduler, view flush) have no request to charge
+    if not has_request_context() or 'metrics_started' not in g:
+        return
+    g.metrics_sql_count += 1
+    g.metrics_sql_time += seconds
+
+def _template_started(app, template, context, **extra):
+    if has_request_context():
+        g.setdefault('metrics_template_starts', []).append(time.perf_counter())
+
+def _template_finished(app, template, context, **extra):
+    if not has_request_context() or not g.get('metrics_template_starts'):
+        return
+    elapsed = time.perf_counter() - g.metrics_template_starts.pop()
+    g.metrics_template_time += elapsed
+    TEMPLATE_DURATION.observe((template.name or '<string>',), elapsed)
+
+def _start_request():
+    g.metrics_started = time.perf_counter()
+    g.metrics_sql_count = 0
+    g.metrics_sql_time = 0.0
+    g.metrics_template_time = 0.0
+
+def _finish_request(response):
+    if 'metrics_started' not in g:
+        return response
+    total = time.perf_counter() - g.metrics_started
+    endpoint = request.endpoint or '<unmatched>'
+    REQUEST_DURATION.observe((endpoint, request.method, str(response.status_code)), total)
+    SQL_QUERIES.inc((endpoint,), g.metrics_sql_count)
+    SQL_SECONDS.inc((endpoint,), g.metrics_sql_time)
+    response.headers['Server-Timing'] = ', '.join([
+        f'db;dur={g.metrics_sql_time * 1000:.2f};desc="{g.metrics_sql_count} queries"',
+        f'tpl;dur={g.metrics_template_time * 1000:.2f}',
+        f'total;dur={total * 1000:.2f}',
+    ])
+    return response
+
+def init_app(app):
+    """Time requests, SQL and templates; add Server-Timing when enabled"""
+    if not app.config.setdefault('METRICS_ENABLED', True):
+        return
+    add_query_listener(_record_query)
+    before_render_template.connect(_template_started, app)
+    template_rendered.connect(_template_finished, app)
+    app.before_request(_start_request)
+    app.after_request(_finish_request)
@@ -0,0 +1,234 @@
+import bisect
+import os
+import sys
+import threading
+import time
+from array import array
+
+from cache import get_content_version
+from database import get_db
+import filters
+
+# How often the in-memory view counts (and the popular ordering) are re-read;
+# view flushes change ilanlar.view without touching update_date
+READ_MODEL_VIEW_REFRESH = 60  # seconds
+# Each sync re-reads rows updated this long before the previous one, so a
+# write transaction that committed late is never missed
+SYNC_OVERLAP = 60  # seconds
+# Above this many changed rows the orderings are re-sorted from scratch
+INCREMENTAL_LIMIT = 1000
+# Filtered orderings kept per snapshot
+MAX_FILTERED_ORDERINGS = 32
+
+# Card fields of an active listing, as the public list templates use them
+CARD_COLUMNS = ('id', 'title', 'advertisement_type', 'img_1', 'sale_price', 'rent_price', 'view',
+                'is_gold', 'contract_id', 'adres', 'bed_type', 'description', 'creation_date',
+                'update_date')
+# Cards show the first 100 characters of the description and '...' past that
+DESCRIPTION_LENGTH = 101
+# Low-cardinality text shared between listings
+_INTERNED = ('advertisement_type', 'bed_type', 'adres')
+
+_SELECT_CARDS = f'''
+    SELECT {', '.join(column for column in CARD_COLUMNS if column != 'description')},
+           substr(description, 1, {DESCRIPTION_LENGTH}) AS description, status
+    FROM ilanlar
+'''
+
+_snapshot = None
+_snapshot_pid = None
+_lock = threading.Lock()
+_enabled = True
+_view_refresh = READ_MODEL_VIEW_REFRESH
+
+class Listing:
+    """Card fields of one active listing; reads like a sqlite3.Row"""
+
+    __slots__ = CARD_COLUMNS
+
+    def __init__(self, row):
+        for column in CARD_COLUMNS:
+            value = row[column]
+            if column in _INTERNED and value is not None:
+                value = sys.intern(value)
+            setattr(self, column, value)
+
+    def __getitem__(self, key):
+        return getattr(self, key)
+
+    def with_view(self, view):
+        """Copy with another view count (listings are never changed in place)"""
+        listing = object.__new__(Listing)
+        for column in CARD_COLUMNS:
+            setattr(listing, column, getattr(self, column))
+        listing.view = view
+        return listing
+
+def _creation_key(listing):
+    return (listing.creation_date or '', listing.id)
+
+def _view_key(listing):
+    return (listing.view or 0, listing.id)
+
+def _sorted_ids(listings, key):
+    return array('q', sorted(listings, key=lambda ad_id: key(listings[ad_id])))
+
+class Snapshot:
+    """Immutable set of active listings with orderings by creation date and views.
+
+    Orderings are ascending arrays of ids; pages are read from their end.
+    A refresh builds a new snapshot, so readers never see one half-updated.
+    """
+
+    __slots__ = ('listings', 'by_creation', 'by_view', 'version', 'synced_until',
+                 'views_at', '_filtered')
+
+    def __init__(self, listings, by_creation, by_view, version, synced_until, views_at):
+        self.listings = listings
+        self.by_creation = by_creation
+        self.by_view = by_view
+        self.version = version
+        self.synced_until = synced_until
+        self.views_at = views_at
+        self._filtered = {}
+
+    def __len__(self):
+        return len(self.listings)
+
+    def newest(self, limit):
+        """Latest listings, newest first (ORDER BY creation_date DESC)"""
+        return [self.listings[ad_id] for ad_id in reversed(self.by_creation[-limit:])]
+
+    def most_viewed(self, limit):
+        """Most viewed listings first (ORDER BY view DESC)"""
+        return [self.listings[ad_id] for ad_id in reversed(self.by_view[-limit:])]
+
+    def ordering(self, listing_filters):
+        """Ids matching the /ilanlar filters, by creation date"""
+        if not listing_filters:
+            return self.by_creation
+        key = tuple(sorted(listing_filters.items()))
+        ids = self._filtered.get(key)
+        if ids is None:
+            ids = array('q', (ad_id for ad_id in self.by_creation
+                              if filters.matches(self.listings[ad_id], listing_filters)))
+            if len(self._filtered) >= MAX_FILTERED_ORDERINGS:
+                # Filter values are user input, keep the memo bounded
+                self._filtered.clear()
+            self._filtered[key] = ids
+        return ids
+
+    def page(self, listing_filters, after, offset, limit):
+        """(total, listings) for a newest-first page by offset or by an (creation_date, id) cursor"""
+        ids = self.ordering(listing_filters)
+        if after is not None:
+            end = bisect.bisect_left(ids, after, key=lambda ad_id: _creation_key(self.listings[ad_id]))
+        else:
+            end = len(ids) - offset
+        if end <= 0:
+            return len(ids), []
+        return len(ids), [self.listings[ad_id] for ad_id in reversed(ids[max(end - limit, 0):end])]
+
+def _db_time(conn, seconds_ago):
+    return conn.execute("SELECT datetime('now', ?)", (f'-{int(seconds_ago)} seconds',)).fetchone()[0]
+
+def load_snapshot(conn, version):
+    """Read every active listing into a new snapshot"""
+    synced_until = _db_time(conn, SYNC_OVERLAP)
+    listings = {row['id']: Listing(row) for row in conn.execute(_SELECT_CARDS + 'WHERE status = 1')}
+    return Snapshot(listings, _sorted_ids(listings, _creation_key), _sorted_ids(listings, _view_key),
+                    version, synced_until, time.monotonic())
+
+def _reorder(ids, changed, listings, key):
+    """Copy of an ordering with the changed ids moved to their new places"""
+    # Take every changed id out first: the rest keep their old sort keys
+    ids = array('q', (ad_id for ad_id in ids if ad_id not in changed))
+    for ad_id in changed:
+        if ad_id in listings:
+            bisect.insort(ids, ad_id, key=lambda other: key(listings[other]))
+    return ids
+
+def sync_snapshot(conn, snapshot, version):
+    """Apply listing writes since the last sync to a copy of the snapshot.
+
+    Rows are found through update_date, which every admin write, import
+    and status change sets. Deletes leave no row behind, so the active
+    count is compared afterwards and the id set reconciled on a mismatch.
+    """
+    synced_until = _db_time(conn, SYNC_OVERLAP)
+    listings = dict(snapshot.listings)
+    changed = set()
+    for row in conn.execute(_SELECT_CARDS + 'WHERE update_date >= ?', (snapshot.synced_until,)):
+        if row['status'] == 1:
+            listings[row['id']] = Listing(row)
+            changed.add(row['id'])
+        elif listings.pop(row['id'], None) is not None:
+            changed.add(row['id'])
+
+    active = conn.execute('SELECT COUNT(*) FROM ilanlar WHERE status = 1').fetchone()[0]
+    if active != len(listings):
+        active_ids = {row[0] for row in conn.execute('SELECT id FROM ilanlar WHERE status = 1')}
+        for ad_id in set(listings) - active_ids:
+            del listings[ad_id]
+            changed.add(ad_id)
+        missing = list(active_ids - set(listings))
+        for start in range(0, len(missing), 500):
+            chunk = missing[start:start + 500]
+            for row in conn.execute(_SELECT_CARDS + f"WHERE id IN ({', '.join('?' for _ in chunk)})", chunk):
+                listings[row['id']] = Listing(row)
+                changed.add(row['id'])
+
+    if len(changed) > INCREMENTAL_LIMIT:
+        by_creation = _sorted_ids(listings, _creation_key)
+        by_view = _sorted_ids(listings, _view_key)
+    else:
+        by_creation = _reorder(snapshot.by_creation, changed, listings, _creation_key)
+        by_view = _reorder(snapshot.by_view, changed, listings, _view_key)
+    return Snapshot(listings, by_creation, by_view, version, synced_until, snapshot.views_at)
+
+def refresh_views(conn, snapshot):
+    """Copy of the snapshot with current view counts and popularity order"""
+    listings = dict(snapshot.listings)
+    for ad_id, view in conn.execute('SELECT id, view FROM ilanlar WHERE status = 1'):
+        listing = listings.get(ad_id)
+        if listing is not None and listing.view != view:
+            listings[ad_id] = listing.with_view(view)
+    return Snapshot(listings, snapshot.by_creation, _sorted_ids(listings, _view_key),
+                    snapshot.version, snapshot.synced_until, time.monotonic())
+
+def get_snapshot():
+    """This worker's snapshot of the active listings, brought up to date.
+
+    Returns None when the read model is disabled. While one thread
+    refreshes, others keep serving the previous snapshot.
+    """
+    global _snapshot, _snapshot_pid
+    if not _enabled:
+        return None
+    snapshot = _snapshot if _snapshot_pid == os.getpid() else None
+    version = get_content_version()
+    if (snapshot is not None and snapshot.version == version
+            and time.monotonic() - snapshot.views_at < _view_refresh):
+        return snapshot
+    if not _lock.acquire(blocking=snapshot is None):
+        return snapshot
+    try:
+        conn = get_db()
+        if _snapshot is None or _snapshot_pid != os.getpid():
+            snapshot = load_snapshot(conn, version)
+        else:
+            snapshot = _snapshot
+            if snapshot.version != version:
+                snapshot = sync_snapshot(conn, snapshot, version)
+            if time.monotonic() - snapshot.views_at >= _view_refresh:
+                snapshot = refresh_views(conn, snapshot)
+        _snapshot, _snapshot_pid = snapshot, os.getpid()
+        return snapshot
+    finally:
+        _lock.release()
+
+def init_app(app):
+    """Read the read model settings"""
+    global _enabled, _view_refresh
+    _enabled = app.config.setdefault('READ_MODEL_ENABLED', True)
+    _view_refresh = app.config.setdefault('READ_MODEL_VIEW_REFRESH', READ_MODEL_VIEW_REFRESH)
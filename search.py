@@ -0,0 +1,56 @@
+import re
+
+# Columns of ilanlar_fts, in declaration order (see migration 5)
+FTS_COLUMNS = ('title', 'adres', 'description', 'description_en', 'description_ar', 'contract_id')
+
+# bm25() weights per FTS column: title and contract number matches rank first
+FTS_WEIGHTS = (10.0, 5.0, 1.0, 1.0, 1.0, 10.0)
+
+# Above this many matches bm25 ranking costs more than it is worth;
+# broad queries list the newest matches first instead
+SEARCH_RANK_LIMIT = 2000
+
+# Longest accepted query, in terms
+MAX_SEARCH_TERMS = 8
+
+_TERM = re.compile(r'\w+', re.UNICODE)
+
+def fold_turkish(text):
+    """Fold dotted/dotless i the way the index does.
+
+    The unicode61 tokenizer already folds case and strips diacritics
+    (ş->s, ğ->g, İ->i) but keeps the dotless ı, so 'kiralik' would not
+    match 'Kiralık'. Index and queries both map it to a plain i.
+    """
+    return text.replace('İ', 'i').replace('ı', 'i')
+
+def fold_sql(column):
+    """SQL counterpart of fold_turkish() for index triggers (the tokenizer handles İ)"""
+    return f"replace({column}, 'ı', 'i')"
+
+def fts_backfill_sql(where=''):
+    """INSERT indexing the ilanlar rows matching `where` in one statement"""
+    return f'''
+        INSERT INTO ilanlar_fts (rowid, {', '.join(FTS_COLUMNS)})
+        SELECT id, {', '.join(fold_sql(c) for c in FTS_COLUMNS)} FROM ilanlar
+        {f'WHERE {where}' if where else ''}
+    '''
+
+def build_match_query(text):
+    """Turn user input into an FTS5 MATCH expression, or None if it has no terms.
+
+    Every term must match (implicit AND) as a prefix, so partial words and
+    contract numbers ('EMN' -> 'EMN001') still hit. Terms are quoted, which
+    keeps FTS5 operators in user input from being interpreted.
+    """
+    terms = _TERM.findall(fold_turkish(text))[:MAX_SEARCH_TERMS]
+    if not terms:
+        return None
+    return ' '.join(f'"{term}"*' for term in terms)
+
+def order_expression(match_count):
+    """ORDER BY for a search: weighted bm25, or newest first for broad queries"""
+    if match_count > SEARCH_RANK_LIMIT:
+        # FTS5 walks its rowids in order, so LIMIT stops early
+        return 'ilanlar_fts.rowid DESC'
+    return f"bm25(ilanlar_fts, {', '.join(str(w) for w in FTS_WEIGHTS)}), ilanlar_fts.rowid DESC"
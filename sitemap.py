@@ -0,0 +1,190 @@
+import os
+import tempfile
+from datetime import datetime, timezone
+from email.utils import format_datetime
+from xml.sax.saxutils import escape, quoteattr
+
+from database import get_db_connection
+
+# Protocol limit of URLs per sitemap file; listings are split by id range
+SITEMAP_MAX_URLS = 50000
+# Newest listings in the feed
+FEED_SIZE = 50
+# Rows per fetch, and entries per streamed chunk
+SITEMAP_BATCH_SIZE = 1000
+# Bytes per read when replaying a cached file
+CACHE_READ_SIZE = 64 * 1024
+
+LANGUAGES = ('tr', 'en', 'ar')
+DESCRIPTION_COLUMNS = {'tr': 'description', 'en': 'description_en', 'ar': 'description_ar'}
+
+SITEMAP_CACHE_DIR = '.sitemap_cache'
+_cache_dir = SITEMAP_CACHE_DIR
+
+def _parse_timestamp(value):
+    """update_date/creation_date as an aware UTC datetime, or None"""
+    if not value:
+        return None
+    try:
+        parsed = datetime.fromisoformat(str(value).replace(' ', 'T'))
+    except ValueError:
+        return None
+    return parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)
+
+def w3c_datetime(value):
+    parsed = _parse_timestamp(value)
+    return parsed.replace(microsecond=0).isoformat() if parsed else None
+
+def _alternates(url):
+    """xhtml:link elements pointing at each language version of a URL"""
+    separator = '&' if '?' in url else '?'
+    links = [f'<xhtml:link rel="alternate" hreflang="{lang}" href={quoteattr(f"{url}{separator}lang={lang}")}/>'
+             for lang in LANGUAGES]
+    links.append(f'<xhtml:link rel="alternate" hreflang="x-default" href={quoteattr(url)}/>')
+    return ''.join(links)
+
+def _url_entry(url, lastmod=None):
+    lastmod = f'<lastmod>{lastmod}</lastmod>' if lastmod else ''
+    return f'<url><loc>{escape(url)}</loc>{lastmod}{_alternates(url)}</url>\n'
+
+_URLSET_OPEN = ('<?xml version="1.0" encoding="UTF-8"?>\n'
+                '<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9" '
+                'xmlns:xhtml="http://www.w3.org/1999/xhtml">\n')
+_URLSET_CLOSE = '</urlset>\n'
+
+def listing_chunks():
+    """(chunk number, latest update_date) of each id range holding active listings"""
+    conn = get_db_connection()
+    try:
+        return [(row[0], row[1]) for row in conn.execute('''
+            SELECT (id - 1) / ? AS chunk, MAX(update_date) FROM ilanlar
+            WHERE status = 1 GROUP BY chunk ORDER BY chunk
+        ''', (SITEMAP_MAX_URLS,))]
+    finally:
+        conn.close()
+
+def iter_sitemap_index(pages_url, listing_urls):
+    """Sitemap index over the static pages sitemap and (url, lastmod) listing sitemaps"""
+    yield ('<?xml version="1.0" encoding="UTF-8"?>\n'
+           '<sitemapindex xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">\n')
+    yield f'<sitemap><loc>{escape(pages_url)}</loc></sitemap>\n'
+    for url, lastmod in listing_urls:
+        lastmod = w3c_datetime(lastmod)
+        yield (f'<sitemap><loc>{escape(url)}</loc>'
+               f"{f'<lastmod>{lastmod}</lastmod>' if lastmod else ''}</sitemap>\n")
+    yield '</sitemapindex>\n'
+
+def iter_pages_sitemap(urls):
+    """Sitemap of the static pages"""
+    yield _URLSET_OPEN
+    for url in urls:
+        yield _url_entry(url)
+    yield _URLSET_CLOSE
+
+def iter_listings_sitemap(listing_url_prefix, chunk):
+    """Sitemap of the active listings in one id range, streamed in batches"""
+    conn = get_db_connection()
+    try:
+        # A rowid range scan, so every chunk costs the same
+        cursor = conn.execute('''
+            SELECT id, update_date FROM ilanlar
+            WHERE id > ? AND id <= ? AND status = 1
+            ORDER BY id
+        ''', (chunk * SITEMAP_MAX_URLS, (chunk + 1) * SITEMAP_MAX_URLS))
+        yield _URLSET_OPEN
+        while True:
+            rows = cursor.fetchmany(SITEMAP_BATCH_SIZE)
+            if not rows:
+                break
+            yield ''.join(_url_entry(f'{listing_url_prefix}{row[0]}', w3c_datetime(row[1]))
+                          for row in rows)
+        yield _URLSET_CLOSE
+    finally:
+        conn.close()
+
+def iter_feed(lang, title, site_url, feed_url, listing_url_prefix):
+    """RSS 2.0 feed of the newest active listings in one language"""
+    description_column = DESCRIPTION_COLUMNS[lang]
+    conn = get_db_connection()
+    try:
+        rows = conn.execute(f'''
+            SELECT id, title, advertisement_type, adres,
+                   COALESCE(NULLIF({description_column}, ''), description) AS description,
+                   creation_date, update_date
+            FROM ilanlar
+            WHERE status = 1
+            ORDER BY creation_date DESC, id DESC
+            LIMIT ?
+        ''', (FEED_SIZE,)).fetchall()
+    finally:
+        conn.close()
+
+    updated = max((_parse_timestamp(row['update_date']) for row in rows if row['update_date']),
+                  default=None)
+    yield ('<?xml version="1.0" encoding="UTF-8"?>\n'
+           '<rss version="2.0" xmlns:atom="http://www.w3.org/2005/Atom">\n<channel>\n'
+           f'<title>{escape(title)}</title>\n<link>{escape(site_url)}</link>\n'
+           f'<description>{escape(title)}</description>\n<language>{lang}</language>\n'
+           f'<atom:link href={quoteattr(feed_url)} rel="self" type="application/rss+xml"/>\n')
+    if updated:
+        yield f'<lastBuildDate>{format_datetime(updated)}</lastBuildDate>\n'
+    for row in rows:
+        link = escape(f"{listing_url_prefix}{row['id']}?lang={lang}")
+        item = [f"<item><title>{escape(row['title'] or '')}</title>",
+                f'<link>{link}</link><guid>{link}</guid>']
+        published = _parse_timestamp(row['creation_date'])
+        if published:
+            item.append(f'<pubDate>{format_datetime(published)}</pubDate>')
+        if row['advertisement_type']:
+            item.append(f"<category>{escape(row['advertisement_type'])}</category>")
+        item.append(f"<description>{escape(row['description'] or row['adres'] or '')}</description></item>\n")
+        yield ''.join(item)
+    yield '</channel>\n</rss>\n'
+
+def _read_file(path):
+    with open(path, 'rb') as f:
+        while True:
+            block = f.read(CACHE_READ_SIZE)
+            if not block:
+                return
+            yield block
+
+def _write_through(path, chunks):
+    """Stream chunks while saving them; the file only appears once complete"""
+    os.makedirs(_cache_dir, exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(dir=_cache_dir, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as out:
+            for chunk in chunks:
+                data = chunk.encode('utf-8')
+                out.write(data)
+                yield data
+        os.replace(temp_path, path)
+    finally:
+        # Client went away (GeneratorExit) or generation failed
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+    prefix = os.path.basename(path).rsplit('-', 1)[0] + '-'
+    for name in os.listdir(_cache_dir):
+        # Files of older content versions are never served again
+        if name.startswith(prefix) and name.endswith('.xml') and name != os.path.basename(path):
+            try:
+                os.remove(os.path.join(_cache_dir, name))
+            except OSError:
+                pass
+
+def cached_stream(name, version, make_chunks):
+    """Bytes of a generated document, built once per content version.
+
+    The first request streams the generator to the client while writing it
+    to the cache directory; later requests replay the file.
+    """
+    path = os.path.join(_cache_dir, f'{name}-{version}.xml')
+    if os.path.exists(path):
+        return _read_file(path)
+    return _write_through(path, make_chunks())
+
+def init_app(app):
+    """Bind the cache directory to the app config"""
+    global _cache_dir
+    _cache_dir = app.config.setdefault('SITEMAP_CACHE_DIR', SITEMAP_CACHE_DIR)
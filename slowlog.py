@@ -0,0 +1,163 @@
+import hashlib
+import json
+import logging
+import re
+import sqlite3
+import time
+from logging.handlers import RotatingFileHandler
+
+import click
+from flask import has_request_context, request
+
+from database import add_query_listener
+
+SLOW_QUERY_MS = 50
+SLOW_QUERY_LOG = 'slow_queries.log'
+SLOW_QUERY_LOG_BYTES = 5 * 1024 * 1024
+SLOW_QUERY_LOG_BACKUPS = 5
+
+# Statements worth an EXPLAIN QUERY PLAN
+_EXPLAINABLE = ('SELECT', 'WITH', 'UPDATE', 'DELETE', 'INSERT', 'REPLACE')
+
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_LITERAL = re.compile(r'(?<![\w.])-?\d+(?:\.\d+)?\b')
+_WHITESPACE = re.compile(r'\s+')
+
+_threshold = SLOW_QUERY_MS / 1000
+_log_path = SLOW_QUERY_LOG
+_logger = logging.getLogger('slow_queries')
+_logger.propagate = False
+
+def normalize_sql(sql):
+    """Collapse whitespace and literals so the same query always looks the same"""
+    sql = _STRING_LITERAL.sub('?', sql)
+    sql = _NUMBER_LITERAL.sub('?', sql)
+    return _WHITESPACE.sub(' ', sql).strip()
+
+def fingerprint(normalized):
+    return hashlib.sha1(normalized.encode('utf-8')).hexdigest()[:12]
+
+def params_shape(params):
+    """Parameter types without their values, which may hold personal data"""
+    if params is None:
+        return 'many'
+    if isinstance(params, dict):
+        return {name: type(value).__name__ for name, value in params.items()}
+    return [type(value).__name__ for value in params]
+
+def explain(conn, sql, params):
+    """EXPLAIN QUERY PLAN rows as indented text, or None if it cannot be planned"""
+    if params is None or not sql.lstrip().upper().startswith(_EXPLAINABLE):
+        return None
+    try:
+        # The base class method keeps this statement out of the listeners
+        rows = sqlite3.Connection.execute(conn, 'EXPLAIN QUERY PLAN ' + sql, params).fetchall()
+    except sqlite3.Error as e:
+        return f'(plan unavailable: {e})'
+    depth = {0: 0}
+    lines = []
+    for row in rows:
+        node, parent, detail = row[0], row[1], row[3]
+        depth[node] = depth.get(parent, 0) + 1
+        lines.append('  ' * (depth[node] - 1) + detail)
+    return '\n'.join(lines)
+
+def _record_slow_query(conn, sql, params, seconds):
+    if seconds < _threshold:
+        return
+    normalized = normalize_sql(sql)
+    entry = {
+        'ts': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'duration_ms': round(seconds * 1000, 3),
+        'fingerprint': fingerprint(normalized),
+        'sql': normalized,
+        'params': params_shape(params),
+        'endpoint': request.endpoint if has_request_context() else None,
+        'plan': explain(conn, sql, params),
+    }
+    _logger.warning(json.dumps(entry, ensure_ascii=False))
+
+def read_entries(path):
+    """Slow-query entries from a log and its rotated backups, oldest first"""
+    entries = []
+    for index in range(SLOW_QUERY_LOG_BACKUPS, -1, -1):
+        name = f'{path}.{index}' if index else path
+        try:
+            with open(name, encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        entries.append(json.loads(line))
+                    except ValueError:
+                        continue
+        except OSError:
+            continue
+    return entries
+
+def aggregate(entries):
+    """Group entries by query fingerprint with count, total, mean and max time"""
+    groups = {}
+    for entry in entries:
+        group = groups.setdefault(entry['fingerprint'], {
+            'fingerprint': entry['fingerprint'], 'sql': entry['sql'], 'count': 0,
+            'total_ms': 0.0, 'max_ms': 0.0, 'endpoints': set(), 'plan': None, 'last_seen': None,
+        })
+        group['count'] += 1
+        group['total_ms'] += entry['duration_ms']
+        group['max_ms'] = max(group['max_ms'], entry['duration_ms'])
+        if entry.get('endpoint'):
+            group['endpoints'].add(entry['endpoint'])
+        # Keep the latest plan: it reflects the current indexes
+        group['plan'] = entry.get('plan') or group['plan']
+        group['last_seen'] = entry['ts']
+    for group in groups.values():
+        group['mean_ms'] = group['total_ms'] / group['count']
+        group['endpoints'] = sorted(group['endpoints'])
+        # A SCAN of a table (not of an index) reads every row
+        group['full_scan'] = bool(group['plan'] and re.search(r'\bSCAN (?!.*\bINDEX\b)', group['plan']))
+    return list(groups.values())
+
+@click.command('slow-queries')
+@click.option('--log', 'path', default=None, help='Log file (default: SLOW_QUERY_LOG)')
+@click.option('--top', default=10, show_default=True, help='Number of queries to show')
+@click.option('--sort', type=click.Choice(['total', 'max', 'mean', 'count']), default='total', show_default=True)
+@click.option('--json', 'as_json', is_flag=True, help='Print the report as JSON')
+def slow_queries_command(path, top, sort, as_json):
+    """Report the worst queries in the slow-query log."""
+    groups = aggregate(read_entries(path or _log_path))
+    key = {'total': 'total_ms', 'max': 'max_ms', 'mean': 'mean_ms', 'count': 'count'}[sort]
+    groups = sorted(groups, key=lambda group: group[key], reverse=True)[:top]
+    if as_json:
+        click.echo(json.dumps(groups, indent=2, ensure_ascii=False))
+        return
+    if not groups:
+        click.echo('No slow queries logged.')
+        return
+    for rank, group in enumerate(groups, 1):
+        click.echo(f"#{rank} [{group['fingerprint']}] {group['count']}x  total {group['total_ms']:.1f}ms  "
+                   f"mean {group['mean_ms']:.1f}ms  max {group['max_ms']:.1f}ms"
+                   f"{'  FULL SCAN' if group['full_scan'] else ''}")
+        click.echo(f"   endpoints: {', '.join(group['endpoints']) or '-'}  last seen: {group['last_seen']}")
+        click.echo(f"   {group['sql']}")
+        if group['plan']:
+            for line in group['plan'].splitlines():
+                click.echo(f'     {line}')
+        click.echo('')
+
+def init_app(app):
+    """Log statements slower than SLOW_QUERY_MS to a rotating file"""
+    global _threshold, _log_path
+    _log_path = app.config.setdefault('SLOW_QUERY_LOG', SLOW_QUERY_LOG)
+    app.cli.add_command(slow_queries_command)
+    threshold_ms = app.config.setdefault('SLOW_QUERY_MS', SLOW_QUERY_MS)
+    if threshold_ms is None or threshold_ms < 0:
+        return
+    _threshold = threshold_ms / 1000
+    if not _logger.handlers:
+        # One file per deployment; with several workers, rotation may
+        # occasionally drop lines, which is fine for a diagnostic log
+        handler = RotatingFileHandler(_log_path, maxBytes=SLOW_QUERY_LOG_BYTES,
+                                      backupCount=SLOW_QUERY_LOG_BACKUPS, encoding='utf-8', delay=True)
+        handler.setFormatter(logging.Formatter('%(message)s'))
+        _logger.addHandler(handler)
+        _logger.setLevel(logging.WARNING)
+    add_query_listener(_record_slow_query)
@@ -0,0 +1,46 @@
+import os
+import time
+
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+
+import assets
+import templating
+from database import init_db
+
+def prepare_storage(app):
+    """Migrate the database and create the upload folder"""
+    init_db()
+    os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
+
+def prepare(app):
+    """Everything a worker would otherwise do on its own, done once up front.
+
+    Runs the migrations, creates the upload folder, compiles every template
+    (filling the bytecode cache on disk) and loads the asset manifest.
+    Returns the number of templates that failed to compile.
+    """
+    started = time.perf_counter()
+    prepare_storage(app)
+    compiled, failed = templating.precompile_templates(app)
+    manifest = assets.load_manifest()
+    print(f"Prepared app: {compiled} templates compiled ({failed} failed), "
+          f"{len(manifest)} built assets, in {time.perf_counter() - started:.2f}s")
+    return failed
+
+@click.command('prepare')
+@with_appcontext
+@click.pass_context
+def prepare_command(ctx):
+    """Migrate, compile templates and load the asset manifest (run before starting workers)."""
+    if prepare(current_app):
+        ctx.exit(1)
+
+def init_app(app):
+    """Register the prepare command; without a launcher, prepare storage on import"""
+    app.cli.add_command(prepare_command)
+    # The production launcher (gunicorn.conf.py) turns this off and runs
+    # prepare() once in the master instead of in every worker
+    if app.config.setdefault('PREPARE_ON_IMPORT', True):
+        prepare_storage(app)
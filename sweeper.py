@@ -0,0 +1,262 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+
+import click
+from flask import g
+
+from database import get_db_connection, get_state, set_state
+import images
+import uploads
+
+# How often queued deletions are processed
+UPLOAD_SWEEP_INTERVAL = 60  # seconds
+# How often the upload folder is reconciled against listing references
+UPLOAD_RECONCILE_INTERVAL = 24 * 3600  # seconds
+# Files younger than this may belong to an upload whose transaction is
+# still open, so reconciliation leaves them alone
+UPLOAD_ORPHAN_GRACE = 3600  # seconds
+# Deletions handled per write transaction
+SWEEP_BATCH_SIZE = 100
+
+# Reference counts implied by the listings themselves
+REFERENCE_COUNTS_SQL = '''
+    SELECT path, COUNT(*) FROM (
+        SELECT img_1 AS path FROM ilanlar
+        UNION ALL SELECT img_2 FROM ilanlar
+        UNION ALL SELECT img_3 FROM ilanlar
+    )
+    WHERE path LIKE ?
+    GROUP BY path
+'''
+
+_sweeper_pid = None
+_sweeper_lock = threading.Lock()
+_sweeper_stop = threading.Event()
+_sweeper_wake = threading.Event()
+_enabled = True
+_interval = UPLOAD_SWEEP_INTERVAL
+_reconcile_interval = UPLOAD_RECONCILE_INTERVAL
+_grace = UPLOAD_ORPHAN_GRACE
+
+def _remove_file(path):
+    """Unlink a file, returning the bytes freed (None if it was already gone)"""
+    try:
+        size = os.path.getsize(path)
+        os.remove(path)
+        return size
+    except FileNotFoundError:
+        return None
+
+def sweep_pending(conn=None):
+    """Delete queued uploads that are still unreferenced.
+
+    Each batch runs under the write lock: an upload storing the same
+    content either commits its reference first (and the file is kept) or
+    waits until the file is gone (and writes it again). A passed connection
+    must be in autocommit mode. Returns (files removed, bytes freed).
+    """
+    own_conn = conn is None
+    if own_conn:
+        conn = get_db_connection()
+        conn.isolation_level = None
+    removed = freed = 0
+    try:
+        while True:
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                rows = conn.execute('''
+                    SELECT d.path, u.path IS NOT NULL AS referenced
+                    FROM upload_deletions d LEFT JOIN uploads u ON u.path = d.path
+                    LIMIT ?
+                ''', (SWEEP_BATCH_SIZE,)).fetchall()
+                done = []
+                for row in rows:
+                    path = row['path']
+                    if not row['referenced']:
+                        try:
+                            size = _remove_file(path)
+                        except OSError as e:
+                            # Left queued and retried on the next sweep
+                            print(f"Error deleting upload {path}: {e}")
+                            continue
+                        images.remove_derivatives(path, conn)
+                        uploads.prune_shards(path)
+                        if size is not None:
+                            removed += 1
+                            freed += size
+                    done.append(path)
+                conn.execute('DELETE FROM upload_deletions WHERE path IN (SELECT value FROM json_each(?))',
+                             (json.dumps(done),))
+                conn.execute('COMMIT')
+            except BaseException:
+                conn.execute('ROLLBACK')
+                raise
+            if len(rows) < SWEEP_BATCH_SIZE or not done:
+                return removed, freed
+    finally:
+        if own_conn:
+            conn.close()
+
+def _source_of(path):
+    """The upload a derivative file belongs to (the path itself otherwise)"""
+    base, variant, _ = (path.rsplit('.', 2) + ['', ''])[:3]
+    if variant in {name for name, _ in images.IMAGE_VARIANTS}:
+        return base
+    return path
+
+def reconcile(reclaim=True, grace=None):
+    """Check the uploads table and upload folder against listing references.
+
+    Reference counts are recomputed from img_1/img_2/img_3 and, with
+    reclaim, corrected; files that nothing references (including leftovers
+    of failed inserts) are queued for deletion and swept. Returns a report.
+    """
+    grace = _grace if grace is None else grace
+    report = {'refcount_drift': [], 'missing_files': [], 'orphan_files': 0,
+              'orphan_bytes': 0, 'removed_files': 0, 'freed_bytes': 0}
+    conn = get_db_connection()
+    conn.isolation_level = None
+    try:
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            references = dict(conn.execute(REFERENCE_COUNTS_SQL, (uploads.UPLOAD_FOLDER + '/%',)).fetchall())
+            counted = dict(conn.execute('SELECT path, refcount FROM uploads').fetchall())
+            for path in sorted(set(references) | set(counted)):
+                expected = references.get(path, 0)
+                if counted.get(path) != expected:
+                    report['refcount_drift'].append(
+                        {'path': path, 'refcount': counted.get(path), 'references': expected})
+                if expected and not os.path.exists(path):
+                    report['missing_files'].append(path)
+            if reclaim:
+                conn.execute('DELETE FROM uploads')
+                conn.executemany('INSERT INTO uploads (path, refcount) VALUES (?, ?)', references.items())
+                conn.executemany('INSERT OR IGNORE INTO upload_deletions (path) VALUES (?)',
+                                 [(path,) for path in counted if path not in references])
+                set_state(conn, 'last_upload_reconcile', str(int(time.time())))
+            conn.execute('COMMIT')
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+
+        # Walk the folder outside the lock; the sweeper re-checks every path
+        cutoff = time.time() - grace
+        orphans = []
+        for root, dirs, files in os.walk(uploads.UPLOAD_FOLDER):
+            for name in files:
+                path = os.path.join(root, name).replace(os.sep, '/')
+                if _source_of(path) in references:
+                    continue
+                stat = os.stat(path)
+                if stat.st_mtime > cutoff:
+                    continue
+                orphans.append((path,))
+                report['orphan_bytes'] += stat.st_size
+        report['orphan_files'] = len(orphans)
+
+        if reclaim:
+            conn.execute('BEGIN IMMEDIATE')
+            conn.executemany('INSERT OR IGNORE INTO upload_deletions (path) VALUES (?)', orphans)
+            conn.execute('COMMIT')
+            report['removed_files'], report['freed_bytes'] = sweep_pending(conn)
+    finally:
+        conn.close()
+    return report
+
+def _reconcile_due(interval):
+    conn = get_db_connection()
+    try:
+        last = int(get_state(conn, 'last_upload_reconcile', 0))
+    finally:
+        conn.close()
+    return time.time() - last >= interval
+
+def _format_report(report):
+    return (f"{len(report['refcount_drift'])} refcount mismatches, "
+            f"{len(report['missing_files'])} missing files, "
+            f"{report['orphan_files']} orphan files ({report['orphan_bytes'] / 1024 / 1024:.1f} MB), "
+            f"removed {report['removed_files']} files ({report['freed_bytes'] / 1024 / 1024:.1f} MB)")
+
+def _sweeper_loop(interval, reconcile_interval):
+    while True:
+        _sweeper_wake.clear()
+        try:
+            sweep_pending()
+            if reconcile_interval and _reconcile_due(reconcile_interval):
+                print(f"Reconciled uploads: {_format_report(reconcile())}")
+        except (OSError, sqlite3.Error) as e:
+            print(f"Error sweeping uploads: {e}")
+        _sweeper_wake.wait(interval)
+        if _sweeper_stop.is_set():
+            return
+
+def _ensure_sweeper():
+    """Start this process's sweeper thread (again after a fork)"""
+    global _sweeper_pid
+    pid = os.getpid()
+    if not _enabled or _sweeper_pid == pid:
+        return
+    with _sweeper_lock:
+        if _sweeper_pid == pid:
+            return
+        _sweeper_pid = pid
+        _sweeper_stop.clear()
+        threading.Thread(target=_sweeper_loop, args=(_interval, _reconcile_interval),
+                         name='upload-sweeper', daemon=True).start()
+
+def wake():
+    """Ask the sweeper to process queued deletions now"""
+    _sweeper_wake.set()
+
+def stop_sweeper():
+    """Signal the sweeper thread to exit"""
+    _sweeper_stop.set()
+    _sweeper_wake.set()
+
+def track_new_upload(path):
+    """Remember a file stored by this request, in case its transaction rolls back"""
+    g.setdefault('new_uploads', []).append(path)
+
+def _discard_uncommitted_uploads(exception=None):
+    paths = g.pop('new_uploads', None)
+    conn = g.get('db')
+    if not paths or conn is None or not conn.in_transaction:
+        return
+    # The listing write never committed, so nothing references these files
+    conn.rollback()
+    conn.executemany('INSERT OR IGNORE INTO upload_deletions (path) VALUES (?)',
+                     [(path,) for path in paths])
+    conn.commit()
+    wake()
+
+@click.command('sweep-uploads')
+@click.option('--dry-run', is_flag=True, help='Only report; change nothing')
+@click.option('--grace', default=UPLOAD_ORPHAN_GRACE, show_default=True,
+              help='Ignore files modified within this many seconds')
+@click.option('--json', 'as_json', is_flag=True, help='Print the report as JSON')
+def sweep_uploads_command(dry_run, grace, as_json):
+    """Reconcile the upload folder and delete unreferenced images."""
+    report = reconcile(reclaim=not dry_run, grace=grace)
+    if as_json:
+        click.echo(json.dumps(report, indent=2))
+        return
+    for drift in report['refcount_drift']:
+        click.echo(f"refcount {drift['refcount']} != {drift['references']} references: {drift['path']}")
+    for path in report['missing_files']:
+        click.echo(f"missing: {path}")
+    click.echo(_format_report(report))
+
+def init_app(app):
+    """Read sweeper settings, track request uploads and register the command"""
+    global _enabled, _interval, _reconcile_interval, _grace
+    _enabled = app.config.setdefault('UPLOAD_SWEEP_ENABLED', True)
+    _interval = app.config.setdefault('UPLOAD_SWEEP_INTERVAL', UPLOAD_SWEEP_INTERVAL)
+    _reconcile_interval = app.config.setdefault('UPLOAD_RECONCILE_INTERVAL', UPLOAD_RECONCILE_INTERVAL)
+    _grace = app.config.setdefault('UPLOAD_ORPHAN_GRACE', UPLOAD_ORPHAN_GRACE)
+    app.cli.add_command(sweep_uploads_command)
+    app.teardown_request(_discard_uncommitted_uploads)
+    # Started lazily so each forked worker gets its own thread
+    app.before_request(_ensure_sweeper)
@@ -0,0 +1,130 @@
+import os
+import sqlite3
+import threading
+from datetime import datetime, date
+
+import click
+
+from database import get_db_connection, get_state, set_state
+from cache import bump_content_version
+
+# How often the scheduler thread checks whether the daily jobs are due
+SCHEDULER_INTERVAL = 3600  # seconds
+
+_scheduler_thread = None
+_scheduler_pid = None
+_scheduler_lock = threading.Lock()
+_scheduler_stop = threading.Event()
+_enabled = True
+_interval = SCHEDULER_INTERVAL
+
+def update_views(conn=None):
+    """Bump every active advertisement's views once per day.
+
+    Each listing gets a random increment between 4 and 15 per day elapsed
+    since the last run, applied by a single UPDATE. The last-run marker lives
+    in app_state and is read and written under the same write transaction,
+    so concurrent workers can never apply the same day twice.
+    Returns the number of listings updated.
+    """
+    own_conn = conn is None
+    if own_conn:
+        conn = get_db_connection()
+
+    try:
+        # Take the write lock before looking at the marker
+        if conn.in_transaction:
+            conn.commit()
+        conn.execute('BEGIN IMMEDIATE')
+        current_date = date.today()
+        last_update = get_state(conn, 'last_view_update')
+
+        if last_update is None:
+            # First time running, just save current date
+            set_state(conn, 'last_view_update', current_date.strftime('%Y-%m-%d'))
+            conn.commit()
+            return 0
+
+        # Calculate days since last update
+        days_diff = (current_date - datetime.strptime(last_update, '%Y-%m-%d').date()).days
+
+        if days_diff <= 0:
+            # Already updated today, skip
+            conn.rollback()
+            return 0
+
+        # Random increment between 4 and 15 per row, multiplied by days
+        updated = conn.execute('''
+            UPDATE ilanlar SET view = view + (abs(random()) % 12 + 4) * ?
+            WHERE status = 1
+        ''', (days_diff,)).rowcount
+        set_state(conn, 'last_view_update', current_date.strftime('%Y-%m-%d'))
+        # View counts are shown on cached pages
+        bump_content_version(conn)
+        conn.commit()
+        print(f"Updated views for {updated} advertisements with {days_diff} days of increments")
+        return updated
+
+    except sqlite3.Error as e:
+        print(f"Error updating views: {e}")
+        conn.rollback()
+        return 0
+    finally:
+        if own_conn:
+            conn.close()
+
+def run_daily_jobs():
+    """Run every job that is due; safe to call from any number of workers"""
+    update_views()
+
+def _scheduler_loop(interval):
+    while True:
+        try:
+            run_daily_jobs()
+        except Exception as e:
+            print(f"Error in scheduled jobs: {e}")
+        if _scheduler_stop.wait(interval):
+            return
+
+def start_scheduler(interval=SCHEDULER_INTERVAL):
+    """Start the background scheduler thread (once per process)"""
+    global _scheduler_thread
+    if _scheduler_thread is not None and _scheduler_thread.is_alive():
+        return _scheduler_thread
+    _scheduler_stop.clear()
+    _scheduler_thread = threading.Thread(target=_scheduler_loop, args=(interval,),
+                                         name='daily-jobs', daemon=True)
+    _scheduler_thread.start()
+    return _scheduler_thread
+
+def _ensure_scheduler():
+    """Start this process's scheduler thread (again after a fork)"""
+    global _scheduler_pid
+    pid = os.getpid()
+    if not _enabled or _scheduler_pid == pid:
+        return
+    with _scheduler_lock:
+        if _scheduler_pid == pid:
+            return
+        _scheduler_pid = pid
+        start_scheduler(_interval)
+
+def stop_scheduler():
+    """Signal the scheduler thread to exit"""
+    _scheduler_stop.set()
+
+@click.command('update-views')
+def update_views_command():
+    """Apply the daily view bump now (for cron or manual runs)."""
+    updated = update_views()
+    click.echo(f"Updated {updated} advertisements")
+
+def init_app(app):
+    """Register CLI commands and run the scheduler in each serving process"""
+    global _enabled, _interval
+    _enabled = app.config.get('SCHEDULER_ENABLED', True)
+    _interval = app.config.get('SCHEDULER_INTERVAL', SCHEDULER_INTERVAL)
+    app.cli.add_command(update_views_command)
+    # Started lazily, so importing the app (CLI commands, a preloading
+    # master) starts no thread and each forked worker gets its own
+    app.before_request(_ensure_scheduler)
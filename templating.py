@@ -0,0 +1,59 @@
+import os
+import time
+
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+from jinja2 import FileSystemBytecodeCache, TemplateError
+
+TEMPLATE_CACHE_DIR = '.jinja_cache'  # relative to the app root
+TEMPLATE_EXTENSIONS = ('.html', '.xml', '.txt')
+
+def enable_bytecode_cache(app, directory):
+    """Keep compiled template code on disk so new workers skip compilation"""
+    if not os.path.isabs(directory):
+        directory = os.path.join(app.root_path, directory)
+    try:
+        os.makedirs(directory, exist_ok=True)
+    except OSError as e:
+        print(f"Template bytecode cache disabled: {e}")
+        return None
+    app.jinja_env.bytecode_cache = FileSystemBytecodeCache(directory)
+    return directory
+
+def precompile_templates(app):
+    """Load every template into the environment's cache; returns (compiled, failed)"""
+    env = app.jinja_env
+    # Keep every template resident, not just the 400 most recently used
+    names = env.list_templates(filter_func=lambda name: name.endswith(TEMPLATE_EXTENSIONS))
+    if env.cache is not None and env.cache.capacity < len(names):
+        env.cache.capacity = len(names)
+    compiled = failed = 0
+    for name in names:
+        try:
+            env.get_template(name)
+            compiled += 1
+        except TemplateError as e:
+            print(f"Error precompiling template {name}: {e}")
+            failed += 1
+    return compiled, failed
+
+@click.command('precompile-templates')
+@with_appcontext
+@click.pass_context
+def precompile_templates_command(ctx):
+    """Compile all templates and fill the bytecode cache."""
+    started = time.perf_counter()
+    compiled, failed = precompile_templates(current_app)
+    click.echo(f"Compiled {compiled} templates ({failed} failed) in {time.perf_counter() - started:.2f}s")
+    if failed:
+        ctx.exit(1)
+
+def init_app(app):
+    """Set up the bytecode cache and optionally warm the template cache"""
+    directory = app.config.setdefault('TEMPLATE_CACHE_DIR', TEMPLATE_CACHE_DIR)
+    if directory:
+        enable_bytecode_cache(app, directory)
+    if app.config.setdefault('TEMPLATE_WARMUP', False):
+        precompile_templates(app)
+    app.cli.add_command(precompile_templates_command)
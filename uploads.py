@@ -0,0 +1,105 @@
+import hashlib
+import os
+import tempfile
+
+UPLOAD_FOLDER = 'user_custom_upload'
+
+# Uploads are hashed while they are copied to disk in chunks of this size
+UPLOAD_CHUNK_SIZE = 64 * 1024
+
+def content_path(digest, extension):
+    """Sharded path of an upload: user_custom_upload/ab/cd/abcd....jpg"""
+    return f'{UPLOAD_FOLDER}/{digest[:2]}/{digest[2:4]}/{digest}.{extension}'
+
+def is_managed(path):
+    """Whether a stored image path points into the upload folder"""
+    return bool(path) and path.startswith(UPLOAD_FOLDER + '/')
+
+def _stream_to_temp(stream):
+    """Copy a stream to a temporary file, returning its path and sha256"""
+    digest = hashlib.sha256()
+    fd, temp_path = tempfile.mkstemp(dir=UPLOAD_FOLDER, suffix='.part')
+    try:
+        with os.fdopen(fd, 'wb') as out:
+            while True:
+                chunk = stream.read(UPLOAD_CHUNK_SIZE)
+                if not chunk:
+                    break
+                digest.update(chunk)
+                out.write(chunk)
+    except BaseException:
+        os.remove(temp_path)
+        raise
+    return temp_path, digest.hexdigest()
+
+def add_reference(conn, path):
+    """Take one more reference to a stored upload (caller commits)"""
+    conn.execute('''
+        INSERT INTO uploads (path, refcount) VALUES (?, 1)
+        ON CONFLICT(path) DO UPDATE SET refcount = refcount + 1
+    ''', (path,))
+
+def store_stream(conn, stream, extension):
+    """Store a stream under its content hash and take a reference to it.
+
+    The reference is taken in the caller's transaction, together with the
+    listing write that uses the path. Returns (path, created); created is
+    False when identical content was already stored and the new copy was
+    dropped.
+    """
+    temp_path, digest = _stream_to_temp(stream)
+    path = content_path(digest, extension)
+    add_reference(conn, path)
+
+    if os.path.exists(path):
+        os.remove(temp_path)
+        return path, False
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    os.replace(temp_path, path)
+    return path, True
+
+def store_upload(conn, file, extension):
+    """Store an uploaded file (see store_stream)"""
+    return store_stream(conn, file.stream, extension)
+
+def store_local_file(conn, source, extension=None):
+    """Copy a file from disk into the upload store (see store_stream)"""
+    extension = extension or source.rsplit('.', 1)[-1].lower()
+    with open(source, 'rb') as stream:
+        return store_stream(conn, stream, extension)
+
+def release_upload(conn, path):
+    """Drop one reference to an upload within the caller's transaction.
+
+    The last reference queues the file in upload_deletions, in the same
+    transaction, for the sweeper to remove once nothing uses it. Returns
+    True when that happened.
+    """
+    if not is_managed(path):
+        return False
+    row = conn.execute('''
+        UPDATE uploads SET refcount = refcount - 1 WHERE path = ?
+        RETURNING refcount
+    ''', (path,)).fetchone()
+    if row is None:
+        return False
+    if row['refcount'] > 0:
+        return False
+    conn.execute('DELETE FROM uploads WHERE path = ?', (path,))
+    conn.execute('INSERT OR IGNORE INTO upload_deletions (path) VALUES (?)', (path,))
+    return True
+
+def prune_shards(path):
+    """Remove the shard directories of a deleted upload once they are empty"""
+    shard = os.path.dirname(path)
+    while shard != UPLOAD_FOLDER and shard.startswith(UPLOAD_FOLDER + '/'):
+        try:
+            os.rmdir(shard)
+        except OSError:
+            return  # Not empty (or already gone)
+        shard = os.path.dirname(shard)
+
+def init_app(app):
+    """Bind the upload folder to the app config"""
+    global UPLOAD_FOLDER
+    UPLOAD_FOLDER = app.config.get('UPLOAD_FOLDER', UPLOAD_FOLDER)
@@ -0,0 +1,117 @@
+import atexit
+import os
+import sqlite3
+import threading
+from functools import wraps
+
+from flask import make_response, session
+
+from database import get_db_connection
+
+# How often buffered detail-page hits are written to ilanlar.view
+VIEW_FLUSH_INTERVAL = 30  # seconds
+
+# Listings remembered per session so reloads are not counted again
+SESSION_VIEWED_LIMIT = 50
+
+_lock = threading.Lock()
+_pending = {}  # advertisement id -> hits not yet written
+_flusher_pid = None
+_flusher_stop = threading.Event()
+_enabled = True
+_interval = VIEW_FLUSH_INTERVAL
+
+def flush_views():
+    """Write buffered hits in one transaction; returns the number of listings touched.
+
+    Pending counts are swapped out under the lock, so requests keep
+    recording while the UPDATE runs. On failure they are merged back
+    and retried on the next flush.
+    """
+    global _pending
+    with _lock:
+        batch, _pending = _pending, {}
+    if not batch:
+        return 0
+
+    conn = get_db_connection()
+    try:
+        conn.execute('BEGIN IMMEDIATE')
+        conn.executemany('UPDATE ilanlar SET view = view + ? WHERE id = ? AND status = 1',
+                         [(hits, ad_id) for ad_id, hits in batch.items()])
+        conn.commit()
+        return len(batch)
+    except sqlite3.Error as e:
+        print(f"Error flushing view counts: {e}")
+        if conn.in_transaction:
+            conn.rollback()
+        with _lock:
+            for ad_id, hits in batch.items():
+                _pending[ad_id] = _pending.get(ad_id, 0) + hits
+        return 0
+    finally:
+        conn.close()
+
+def _flusher_loop(interval):
+    while not _flusher_stop.wait(interval):
+        flush_views()
+
+def _ensure_flusher():
+    """Start this process's flush thread (again after a fork)"""
+    global _flusher_pid
+    pid = os.getpid()
+    if _flusher_pid == pid:
+        return
+    with _lock:
+        if _flusher_pid == pid:
+            return
+        _flusher_pid = pid
+        # A forked worker must not flush its parent's hits a second time
+        _pending.clear()
+        _flusher_stop.clear()
+        threading.Thread(target=_flusher_loop, args=(_interval,),
+                         name='view-counter', daemon=True).start()
+
+def record_view(ad_id):
+    """Count one hit for a listing in this worker's buffer"""
+    _ensure_flusher()
+    with _lock:
+        _pending[ad_id] = _pending.get(ad_id, 0) + 1
+
+def _first_view_in_session(ad_id):
+    viewed = session.get('viewed_ads', [])
+    if ad_id in viewed:
+        return False
+    session['viewed_ads'] = (viewed + [ad_id])[-SESSION_VIEWED_LIMIT:]
+    return True
+
+def count_views(view):
+    """Decorator counting successful hits of a detail view, once per session.
+
+    Applied outside the response cache so cached and 304 responses are
+    counted too.
+    """
+    @wraps(view)
+    def wrapper(id, *args, **kwargs):
+        response = make_response(view(id, *args, **kwargs))
+        if _enabled and response.status_code in (200, 304):
+            try:
+                ad_id = int(id)
+            except ValueError:
+                return response
+            if _first_view_in_session(ad_id):
+                record_view(ad_id)
+        return response
+    return wrapper
+
+def stop_flusher():
+    """Stop the flush thread and write what is still buffered"""
+    _flusher_stop.set()
+    flush_views()
+
+def init_app(app):
+    """Read the view counter settings and flush on interpreter exit"""
+    global _enabled, _interval
+    _enabled = app.config.setdefault('VIEW_COUNTER_ENABLED', True)
+    _interval = app.config.setdefault('VIEW_FLUSH_INTERVAL', VIEW_FLUSH_INTERVAL)
+    atexit.register(stop_flusher)